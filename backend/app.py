@@ -8,6 +8,12 @@ from routes.friends import friends_bp
 from routes.friendsList import friends_list_bp
 from routes.one_chat import one_chat_bp
 from routes.random_chat import random_chat_bp
+from routes.presence import presence_bp
+from routes.admin import admin_bp
+from routes.calls import calls_bp
+from service.user_filter import user_filter
+from service.resilience import resilience_status
+from service.analytics import analytics
 from flask_jwt_extended import JWTManager
 import os
 from dotenv import load_dotenv
@@ -56,6 +62,21 @@ app.register_blueprint(friends_bp, url_prefix="/friends")
 app.register_blueprint(friends_list_bp, url_prefix="/friends_list")
 app.register_blueprint(one_chat_bp,url_prefix="/chat")
 app.register_blueprint(random_chat_bp,url_prefix="/random_chat")
+app.register_blueprint(presence_bp,url_prefix="/presence")
+app.register_blueprint(admin_bp,url_prefix="/admin")
+app.register_blueprint(calls_bp,url_prefix="/calls")
+
+# Seed the user-existence filter in the background
+user_filter.start()
+
+# Periodically flush activity counters for admin analytics
+analytics.start()
+
+
+@app.route("/health/firebase", methods=["GET"])
+def firebase_health():
+    """Circuit breaker state and call counters for monitoring"""
+    return jsonify(resilience_status()), 200
 
 
 
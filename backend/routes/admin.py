@@ -0,0 +1,45 @@
+import os
+import re
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from service.analytics import query_activity
+from service.resilience import guarded_read, DependencyUnavailable
+
+admin_bp = Blueprint("admin", __name__)
+
+# Comma-separated UIDs allowed to use admin endpoints
+ADMIN_UIDS = {uid.strip() for uid in os.getenv("ADMIN_UIDS", "").split(",") if uid.strip()}
+
+BUCKET_FORMATS = {
+    "hour": re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}$"),
+    "day": re.compile(r"^\d{4}-\d{2}-\d{2}$"),
+}
+
+
+@admin_bp.route("/analytics", methods=["GET"])
+@jwt_required()
+def get_activity():
+    """Event counts and distinct active users per hour or day bucket"""
+    try:
+        if get_jwt_identity() not in ADMIN_UIDS:
+            return jsonify({"error": "Unauthorized"}), 403
+
+        granularity = request.args.get("granularity", "day")
+        start = request.args.get("start", "")
+        end = request.args.get("end", "")
+
+        bucket_format = BUCKET_FORMATS.get(granularity)
+        if not bucket_format:
+            return jsonify({"error": "Granularity must be 'hour' or 'day'"}), 400
+        if not bucket_format.match(start) or not bucket_format.match(end) or start > end:
+            return jsonify({"error": "Invalid start/end bucket"}), 400
+
+        return jsonify({
+            "granularity": granularity,
+            "buckets": guarded_read("firestore", lambda: query_activity(granularity, start, end))
+        }), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -2,6 +2,9 @@ import os
 from flask import Blueprint, request, jsonify
 from firebase_admin import auth, exceptions
 from service.firebase import firestore_db
+from service.user_filter import user_filter, create_user_document
+from service.analytics import analytics
+from service.resilience import guarded_read, guarded_write, DependencyUnavailable
 import jwt
 from datetime import datetime, timedelta, UTC
 from typing import Dict, Optional
@@ -29,7 +32,7 @@ def generate_unique_username(display_name: str) -> str:
     base_username = re.sub(r'[^a-z0-9_]', '', display_name.lower())[:15]
     user_ref = firestore_db.collection("users")
     username = base_username
-    while user_ref.where("username", "==", username).limit(1).get():
+    while guarded_read("firestore", user_ref.where("username", "==", username).limit(1).get):
         suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=4))
         username = f"{base_username}_{suffix}"
     return username
@@ -80,7 +83,9 @@ def signup() -> tuple[Dict[str, str], int]:
             "verified": False,
             "created_at": datetime.now(UTC).isoformat()
         }
-        firestore_db.collection("users").document(user.uid).set(user_data)
+        guarded_write("firestore", lambda: create_user_document(user.uid, user_data))
+        user_filter.add(user.uid)
+        analytics.record("signups", user.uid)
 
         # Send verification email 
         print("Attempting to generate verification link for:", email)
@@ -99,6 +104,8 @@ def signup() -> tuple[Dict[str, str], int]:
             "username": username
         }), 201
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except exceptions.FirebaseError as e:
         return jsonify({"error": f"Firebase error: {str(e)}"}), 400
     except ValueError as e:
@@ -135,13 +142,15 @@ def verify_email():
         user = auth.get_user(uid)
 
         if user.email_verified:
-            firestore_db.collection("users").document(uid).update({"verified": True})
+            guarded_write("firestore", lambda: firestore_db.collection("users").document(uid).update({"verified": True}))
             return jsonify({"message": "Email verified successfully"}), 200
         else:
             return jsonify({"error": "Email not verified"}), 400
 
     except auth.UserNotFoundError:
         return jsonify({"error": "User not found"}), 404
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
@@ -168,9 +177,11 @@ def login():
             return jsonify({"error": "Email not verified. Please check your email and verify your account."}), 403
 
  
-        user_ref = firestore_db.collection("users").document(user.uid).get()
+        user_ref = guarded_read("firestore", firestore_db.collection("users").document(user.uid).get)
         if not user_ref.exists:
             return jsonify({"error": "User data not found in Firestore"}), 404
+        user_filter.add(user.uid)
+        analytics.record("logins", user.uid)
 
         user_data = user_ref.to_dict()
         username = user_data.get("username", "Unknown")
@@ -188,6 +199,8 @@ def login():
             "display_name": display_name
         }), 201
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": "Internal server error"}), 500
 
@@ -257,7 +270,7 @@ def google_signup():
             return jsonify({"error": "Invalid Google data"}), 400
 
         # Check if user already exists
-        user_ref = firestore_db.collection("users").where("email", "==", email).limit(1).get()
+        user_ref = guarded_read("firestore", firestore_db.collection("users").where("email", "==", email).limit(1).get)
         if user_ref:
             return jsonify({"error": "User already exists, please login"}), 400
 
@@ -275,7 +288,9 @@ def google_signup():
             "verified": True,  # Google users are always verified
             "created_at": datetime.now(UTC).isoformat()
         }
-        firestore_db.collection("users").document(uid).set(user_data)
+        guarded_write("firestore", lambda: create_user_document(uid, user_data))
+        user_filter.add(uid)
+        analytics.record("signups", uid)
 
        
         token = generate_token(uid, email)
@@ -288,6 +303,8 @@ def google_signup():
             "display_name": name
         }), 201
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         print(f"Google Login Error: {str(e)}")  
         return jsonify({"error": f"Google Signup failed: {str(e)}"}), 500
@@ -313,9 +330,11 @@ def google_login():
             return jsonify({"error": "Invalid Google token"}), 400
 
         # Check if user exists in Firestore
-        user_ref = firestore_db.collection("users").document(uid).get()
+        user_ref = guarded_read("firestore", firestore_db.collection("users").document(uid).get)
         if not user_ref.exists:
             return jsonify({"error": "User does not exist. Please sign up first."}), 404
+        user_filter.add(uid)
+        analytics.record("logins", uid)
 
         user_data = user_ref.to_dict()
         username = user_data.get("username", "Unknown")
@@ -332,5 +351,7 @@ def google_login():
             "display_name": display_name
         }), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Google Login failed: {str(e)}"}), 500
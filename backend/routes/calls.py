@@ -0,0 +1,170 @@
+import json
+import queue
+from flask import Blueprint, request, jsonify, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from service.firebase import firestore_db
+from service.call_signaling import call_hub, CallError
+from service.resilience import guarded_read, DependencyUnavailable
+
+calls_bp = Blueprint("calls", __name__)
+
+KEEPALIVE_SECONDS = 15
+MAX_SIGNAL_BYTES = 16 * 1024   # SDP blobs are a few KB; candidates far less
+MAX_HISTORY_PAGE = 100
+
+
+def signal_payload(data, key):
+    """Pull an SDP/candidate payload out of the request body, or None if invalid."""
+    value = data.get(key)
+    if value is None or len(json.dumps(value)) > MAX_SIGNAL_BYTES:
+        return None
+    return value
+
+
+def event_stream(conn):
+    try:
+        yield "retry: 2000\n\n"
+        while True:
+            try:
+                event = conn.events.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        call_hub.disconnect(conn)
+
+
+@calls_bp.route("/events", methods=["GET"])
+@jwt_required()
+def events():
+    """
+    Long-lived Server-Sent Events stream of call signals for the logged-in user.
+    Read it with fetch() so the Authorization header can be sent.
+    """
+    try:
+        conn = call_hub.connect(get_jwt_identity())
+        response = Response(event_stream(conn), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@calls_bp.route("/start", methods=["POST"])
+@jwt_required()
+def start_call():
+    """Ring another user with an SDP offer"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        callee_id = data.get("callee_id")
+        offer = signal_payload(data, "offer")
+        if not isinstance(callee_id, str) or not callee_id or offer is None:
+            return jsonify({"error": "callee_id and a valid offer are required"}), 400
+
+        call_id = call_hub.start_call(user_id, callee_id, offer)
+        return jsonify({"call_id": call_id, "ring_timeout": call_hub.ring_timeout}), 200
+
+    except CallError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@calls_bp.route("/answer", methods=["POST"])
+@jwt_required()
+def answer_call():
+    """Accept a ringing call with an SDP answer"""
+    try:
+        data = request.get_json() or {}
+        answer = signal_payload(data, "answer")
+        if not data.get("call_id") or answer is None:
+            return jsonify({"error": "call_id and a valid answer are required"}), 400
+
+        call_hub.answer(get_jwt_identity(), data["call_id"], answer)
+        return jsonify({"success": True}), 200
+
+    except CallError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@calls_bp.route("/candidate", methods=["POST"])
+@jwt_required()
+def relay_candidate():
+    """Forward an ICE candidate to the other participant"""
+    try:
+        data = request.get_json() or {}
+        candidate = signal_payload(data, "candidate")
+        if not data.get("call_id") or candidate is None:
+            return jsonify({"error": "call_id and a valid candidate are required"}), 400
+
+        call_hub.relay_candidate(get_jwt_identity(), data["call_id"], candidate)
+        return jsonify({"success": True}), 200
+
+    except CallError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@calls_bp.route("/reject", methods=["POST"])
+@jwt_required()
+def reject_call():
+    """Decline a ringing call"""
+    try:
+        data = request.get_json() or {}
+        if not data.get("call_id"):
+            return jsonify({"error": "call_id is required"}), 400
+
+        call_hub.reject(get_jwt_identity(), data["call_id"])
+        return jsonify({"success": True}), 200
+
+    except CallError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@calls_bp.route("/end", methods=["POST"])
+@jwt_required()
+def end_call():
+    """Hang up (or cancel an outgoing call that is still ringing)"""
+    try:
+        data = request.get_json() or {}
+        if not data.get("call_id"):
+            return jsonify({"error": "call_id is required"}), 400
+
+        call_hub.end(get_jwt_identity(), data["call_id"])
+        return jsonify({"success": True}), 200
+
+    except CallError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@calls_bp.route("/history", methods=["GET"])
+@jwt_required()
+def call_history():
+    """Most recent calls of the logged-in user, newest first"""
+    try:
+        user_id = get_jwt_identity()
+        limit = min(request.args.get("limit", 20, type=int), MAX_HISTORY_PAGE)
+
+        query = (
+            firestore_db.collection("call_history").document(user_id).collection("calls")
+            .order_by("started_at", direction="DESCENDING")
+            .limit(limit)
+        )
+        calls = [dict(call_id=doc.id, **doc.to_dict()) for doc in guarded_read("firestore", query.get)]
+        return jsonify({"calls": calls}), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from service.firebase  import firestore_db
+from service.avatars import thumbnail_url
+from service.resilience import guarded_read, DependencyUnavailable
 
 find_user_bp = Blueprint('find_user', __name__)
 
@@ -15,10 +17,10 @@ def find_user():
         users_ref = firestore_db.collection("users")
         
         # Query by username
-        username_query = users_ref.where("username", "==", search_query).get()
+        username_query = guarded_read("firestore", users_ref.where("username", "==", search_query).get)
         
         # Query by display name
-        display_name_query = users_ref.where("display_name", "==", search_query).get()
+        display_name_query = guarded_read("firestore", users_ref.where("display_name", "==", search_query).get)
         
         # Combine results & remove duplicates
         users = {}
@@ -30,10 +32,12 @@ def find_user():
                     "id": user_id,  # Include the user ID in the response
                     "display_name": user_data.get("display_name", ""),
                     "username": user_data.get("username", ""),
-                    "profilePic": user_data.get("profilePic", "")
+                    "profilePic": thumbnail_url(user_data)
                 }
 
         return jsonify({"success": True, "users": list(users.values())}), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"success": False, "message": str(e)}), 503
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
\ No newline at end of file
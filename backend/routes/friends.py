@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify
-from service.firebase import realtime_db, firestore_db
+from service.firebase import realtime_db
+from service.friend_graph import friend_graph
+from service.user_filter import user_exists
+from service.resilience import guarded_read, guarded_write, DependencyUnavailable
+from service.avatars import thumbnail_url
+from service.users import get_user_profiles
 from datetime import datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -13,14 +18,55 @@ def validate_user_ids(sender_id, receiver_id):
         return False, "Cannot send request to yourself"
     return True, ""
 
+MAX_BULK_REQUESTS = 100
+
+def friendship_updates(receiver_id, sender_id, timestamp=None):
+    """Multi-path update entries that accept sender_id's request to receiver_id"""
+    timestamp = timestamp or datetime.utcnow().isoformat()
+    return {
+        f"friends/{receiver_id}/{sender_id}": {
+            "status": "accepted",
+            "timestamp": timestamp
+        },
+        f"friends/{sender_id}/{receiver_id}": {
+            "status": "accepted",
+            "timestamp": timestamp
+        },
+        f"friend_requests/{receiver_id}/{sender_id}": None
+    }
+
+def split_bulk_sender_ids(receiver_id, sender_ids, requests_data):
+    """Split requested sender IDs into those with a pending request and those without"""
+    found = []
+    # Only strings can be deduplicated (and be user IDs); anything else is reported back
+    not_found = [sender_id for sender_id in sender_ids if not isinstance(sender_id, str)]
+    for sender_id in dict.fromkeys(s for s in sender_ids if isinstance(s, str)):
+        is_valid, _ = validate_user_ids(sender_id, receiver_id)
+        if is_valid and sender_id in requests_data:
+            found.append(sender_id)
+        else:
+            not_found.append(sender_id)
+    return found, not_found
+
+def read_bulk_request(receiver_id):
+    """Parse and validate a bulk body, reading all of the receiver's requests at once"""
+    data = request.get_json() or {}
+    sender_ids = data.get("sender_ids")
+    if not isinstance(sender_ids, list) or not sender_ids:
+        return None, None, "sender_ids must be a non-empty list"
+    if len(sender_ids) > MAX_BULK_REQUESTS:
+        return None, None, f"At most {MAX_BULK_REQUESTS} requests can be processed at once"
+
+    requests_data = guarded_read("rtdb", realtime_db.reference(f"friend_requests/{receiver_id}").get) or {}
+    found, not_found = split_bulk_sender_ids(receiver_id, sender_ids, requests_data)
+    return found, not_found, ""
+
 @friends_bp.route("/friends_request", methods=["POST"])
 @jwt_required()
 def send_friend_request():
     try:
         sender_id = get_jwt_identity()
-        user_ref = firestore_db.collection("users").document(sender_id)
-        user_doc = user_ref.get()
-        if not user_doc.exists:
+        if not user_exists(sender_id):
             return jsonify({"error": "User not found"}), 404
 
         data = request.get_json()
@@ -31,29 +77,29 @@ def send_friend_request():
             return jsonify({"error": error_msg}), 400
 
         # Check if receiver exists
-        receiver_ref = firestore_db.collection("users").document(receiver_id)
-        receiver_doc = receiver_ref.get()
-        if not receiver_doc.exists:
+        if not user_exists(receiver_id):
             return jsonify({"error": "Receiver not found"}), 404
 
         # Check if already friends
         friends_ref = realtime_db.reference(f"friends/{sender_id}/{receiver_id}")
-        if friends_ref.get():
+        if guarded_read("rtdb", friends_ref.get):
             return jsonify({"error": "You are already friends"}), 400
 
         # Check if request already sent
         request_ref = realtime_db.reference(f"friend_requests/{receiver_id}/{sender_id}")
-        if request_ref.get():
+        if guarded_read("rtdb", request_ref.get):
             return jsonify({"error": "Friend request already sent"}), 400
 
         # Send friend request
-        request_ref.set({
+        guarded_write("rtdb", lambda: request_ref.set({
             "status": "pending",
             "timestamp": datetime.utcnow().isoformat()
-        })
+        }))
 
         return jsonify({"message": "Friend request sent successfully"}), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
@@ -64,9 +110,7 @@ def accept_friend_request():
         receiver_id = get_jwt_identity()  # This should be User A
         print(f"Receiver ID (JWT Identity): {receiver_id}")
 
-        user_ref = firestore_db.collection("users").document(receiver_id)
-        user_doc = user_ref.get()
-        if not user_doc.exists:
+        if not user_exists(receiver_id):
             return jsonify({"error": "User not found"}), 404
 
         data = request.get_json()
@@ -74,29 +118,23 @@ def accept_friend_request():
         print(f"Sender ID (from request body): {sender_id}")
 
         request_ref = realtime_db.reference(f"friend_requests/{receiver_id}/{sender_id}")
-        request_data = request_ref.get()
+        request_data = guarded_read("rtdb", request_ref.get)
         print(f"Request Path: friend_requests/{receiver_id}/{sender_id}")
         print(f"Request Data from Firebase: {request_data}")
 
         if not request_data:
             return jsonify({"error": "No friend request found"}), 404
 
-        # Proceed with accepting the request
-        updates = {
-            f"friends/{receiver_id}/{sender_id}": {
-                "status": "accepted",
-                "timestamp": datetime.utcnow().isoformat()
-            },
-            f"friends/{sender_id}/{receiver_id}": {
-                "status": "accepted",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        }
-        realtime_db.reference("/").update(updates)
-        request_ref.delete()
+        # Proceed with accepting the request; the friendship edges and the
+        # request deletion are committed together in one multi-path update
+        updates = friendship_updates(receiver_id, sender_id)
+        guarded_write("rtdb", lambda: realtime_db.reference("/").update(updates))
+        friend_graph.add_friendship(receiver_id, sender_id)
 
         return jsonify({"message": "Friend request accepted"}), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
@@ -106,9 +144,7 @@ def accept_friend_request():
 def reject_friend_request():
     try:
         receiver_id = get_jwt_identity()
-        user_ref = firestore_db.collection("users").document(receiver_id)
-        user_doc = user_ref.get()
-        if not user_doc.exists:
+        if not user_exists(receiver_id):
             return jsonify({"error": "User not found"}), 404
 
         data = request.get_json()
@@ -120,17 +156,81 @@ def reject_friend_request():
 
         # Check if request exists
         request_ref = realtime_db.reference(f"friend_requests/{receiver_id}/{sender_id}")
-        if not request_ref.get():
+        if not guarded_read("rtdb", request_ref.get):
             return jsonify({"error": "No friend request found"}), 404
 
         # Delete the request
-        request_ref.delete()
+        guarded_write("rtdb", request_ref.delete)
         return jsonify({"message": "Friend request rejected"}), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
-    
-    
+
+
+@friends_bp.route("/accept_requests", methods=["POST"])
+@jwt_required()
+def bulk_accept_friend_requests():
+    """Accept several friend requests with a single atomic multi-path update"""
+    try:
+        receiver_id = get_jwt_identity()
+        if not user_exists(receiver_id):
+            return jsonify({"error": "User not found"}), 404
+
+        accepted, not_found, error_msg = read_bulk_request(receiver_id)
+        if error_msg:
+            return jsonify({"error": error_msg}), 400
+
+        if accepted:
+            timestamp = datetime.utcnow().isoformat()
+            updates = {}
+            for sender_id in accepted:
+                updates.update(friendship_updates(receiver_id, sender_id, timestamp))
+            guarded_write("rtdb", lambda: realtime_db.reference("/").update(updates))
+            for sender_id in accepted:
+                friend_graph.add_friendship(receiver_id, sender_id)
+
+        return jsonify({
+            "message": f"{len(accepted)} friend request(s) accepted",
+            "accepted": accepted,
+            "not_found": not_found
+        }), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@friends_bp.route("/reject_requests", methods=["POST"])
+@jwt_required()
+def bulk_reject_friend_requests():
+    """Reject several friend requests with a single atomic multi-path update"""
+    try:
+        receiver_id = get_jwt_identity()
+        if not user_exists(receiver_id):
+            return jsonify({"error": "User not found"}), 404
+
+        rejected, not_found, error_msg = read_bulk_request(receiver_id)
+        if error_msg:
+            return jsonify({"error": error_msg}), 400
+
+        if rejected:
+            updates = {f"friend_requests/{receiver_id}/{sender_id}": None for sender_id in rejected}
+            guarded_write("rtdb", lambda: realtime_db.reference("/").update(updates))
+
+        return jsonify({
+            "message": f"{len(rejected)} friend request(s) rejected",
+            "rejected": rejected,
+            "not_found": not_found
+        }), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
 
 @friends_bp.route("/pending_requests", methods=["GET"])
 @jwt_required()
@@ -138,42 +238,85 @@ def get_pending_requests():
     """Fetch pending friend requests for the logged-in user"""
     try:
         user_id = get_jwt_identity()
-        user_ref = firestore_db.collection("users").document(user_id)
-        user_doc = user_ref.get()
-        if not user_doc.exists:
+        if not user_exists(user_id):
             return jsonify({"error": "User not found"}), 404
 
         # Fetch pending requests from Realtime Database
         requests_ref = realtime_db.reference(f"friend_requests/{user_id}")
-        requests_data = requests_ref.get() or {}
+        requests_data = guarded_read("rtdb", requests_ref.get) or {}
+
+        sender_ids = [
+            sender_id for sender_id, request_info in requests_data.items()
+            if request_info.get("status") == "pending"
+        ]
+        # Fetch every sender's display_name and profilePic in one Firestore read
+        profiles = get_user_profiles(sender_ids)
 
         pending_requests = []
-        for sender_id, request_info in requests_data.items():
-            if request_info.get("status") == "pending":
-                # Fetch sender's display_name and profilePic from Firestore
-                sender_ref = firestore_db.collection("users").document(sender_id)
-                sender_doc = sender_ref.get()
-                if sender_doc.exists:
-                    sender_data = sender_doc.to_dict()
-                    sender_username = sender_data.get("username", "")
-                    display_name = sender_data.get("display_name", sender_username)
-                    profile_pic = sender_data.get("profilePic", "")
-                else:
-                    sender_username = ""
-                    display_name = "Unknown User"
-                    profile_pic = ""
-
-                pending_requests.append({
-                    "sender_id": sender_id,
-                    "sender_username": sender_username,
-                    "display_name": display_name,
-                    "profile_pic": profile_pic,
-                })
+        for sender_id in sender_ids:
+            sender_data = profiles.get(sender_id)
+            if sender_data:
+                sender_username = sender_data.get("username", "")
+                display_name = sender_data.get("display_name", sender_username)
+                profile_pic = thumbnail_url(sender_data)
+            else:
+                sender_username = ""
+                display_name = "Unknown User"
+                profile_pic = ""
+
+            pending_requests.append({
+                "sender_id": sender_id,
+                "sender_username": sender_username,
+                "display_name": display_name,
+                "profile_pic": profile_pic,
+            })
 
         return jsonify({
             "message": "Pending requests retrieved successfully",
             "requests": pending_requests
         }), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@friends_bp.route("/suggestions", methods=["GET"])
+@jwt_required()
+def get_friend_suggestions():
+    """Suggest people the logged-in user may know, ranked by mutual friends"""
+    try:
+        user_id = get_jwt_identity()
+        limit = max(1, min(request.args.get("limit", 10, type=int), 50))
+
+        ranked = friend_graph.suggestions(user_id, limit=limit)
+        if not ranked:
+            return jsonify({"message": "No suggestions available", "suggestions": []}), 200
+
+        # Fetch every candidate profile in a single batched Firestore read
+        profiles = get_user_profiles(uid for uid, _ in ranked)
+
+        suggestions = []
+        for candidate_id, mutual_count in ranked:
+            candidate_data = profiles.get(candidate_id)
+            if not candidate_data:
+                continue
+            username = candidate_data.get("username", "")
+            suggestions.append({
+                "user_id": candidate_id,
+                "username": username,
+                "display_name": candidate_data.get("display_name", username),
+                "profile_pic": thumbnail_url(candidate_data),
+                "mutual_friends": mutual_count,
+            })
+
+        return jsonify({
+            "message": "Suggestions retrieved successfully",
+            "suggestions": suggestions
+        }), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": f"Server error: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
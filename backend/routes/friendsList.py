@@ -1,5 +1,8 @@
 from flask import Blueprint, jsonify, request
-from service.firebase import realtime_db, firestore_db
+from service.firebase import realtime_db
+from service.resilience import guarded_read, DependencyUnavailable
+from service.avatars import thumbnail_url
+from service.users import get_user_profiles
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 friends_list_bp = Blueprint("friends_list", __name__)
@@ -13,37 +16,44 @@ def get_friends_list():
         
         # Fetch the friends from Firebase Realtime Database
         friends_ref = realtime_db.reference(f"friends/{current_user_id}")
-        friends_data = friends_ref.get() or {}
+        friends_data = guarded_read("rtdb", friends_ref.get) or {}
         
         friends_list = []
 
         # Extract actual friend IDs from nested structure
-        for friend_id, friend_info in friends_data.items():
-            if friend_info.get("status") == "accepted":  # Only show accepted friends
-                user_doc = firestore_db.collection("users").document(friend_id).get()
-                
-                # Prepare friend data even if Firestore document doesn't exist
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    username = user_data.get("username", "")
-                    display_name = user_data.get("display_name", username)
-                    profile_pic = user_data.get("profilePic", "")
-                else:
-                    username = ""
-                    display_name = "Unknown User"
-                    profile_pic = ""
-
-                friends_list.append({
-                    "user_id": friend_id,
-                    "username": username,
-                    "display_name": display_name,
-                    "profile_pic": profile_pic
-                })
+        friend_ids = [
+            friend_id for friend_id, friend_info in friends_data.items()
+            if friend_info.get("status") == "accepted"  # Only show accepted friends
+        ]
+        # All friend profiles in one batched Firestore read
+        profiles = get_user_profiles(friend_ids)
+
+        for friend_id in friend_ids:
+            user_data = profiles.get(friend_id)
+
+            # Prepare friend data even if Firestore document doesn't exist
+            if user_data:
+                username = user_data.get("username", "")
+                display_name = user_data.get("display_name", username)
+                profile_pic = thumbnail_url(user_data)
+            else:
+                username = ""
+                display_name = "Unknown User"
+                profile_pic = ""
+
+            friends_list.append({
+                "user_id": friend_id,
+                "username": username,
+                "display_name": display_name,
+                "profile_pic": profile_pic
+            })
 
         return jsonify({
             "message": "Friends list retrieved successfully",
             "friends": friends_list
         }), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
\ No newline at end of file
@@ -1,10 +1,67 @@
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, request, jsonify, Blueprint, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from service.firebase import realtime_db
+from service.chat_shards import chat_db
+from service.resilience import guarded_read, guarded_write, DependencyUnavailable, WriteOutcomeUnknown
+from service.message_search import message_search
+from service.analytics import analytics
+from service.inbox import inbox_updates
+from utils.push_id import generate_push_id
+import json
+import re
 import time
+import zlib
 
 one_chat_bp = Blueprint("chat", __name__)
 
+# RTDB server value that atomically increments a counter
+INCREMENT_ONE = {".sv": {"increment": 1}}
+MAX_INBOX_PAGE = 50
+MAX_BATCH_MESSAGES = 100
+MAX_MESSAGE_LENGTH = 1000
+EXPORT_CHUNK_SIZE = 500
+
+# Batch-sent client_ids are recorded durably under client_ids/{sender}/{day}
+# in the same update as the messages, so a replay reaching any worker (or
+# arriving after a restart) is recognised. Only today and yesterday are kept.
+# With sharded chat storage the registry lives on the default instance and is
+# written after the chat data, so a failure between the two can still let one
+# replay through.
+CLIENT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+CLIENT_ID_DAYS_KEPT = 2
+
+def client_id_days(now=None):
+    """Day keys (newest first) whose client_ids are still checked for replays"""
+    now = time.time() if now is None else now
+    return [time.strftime("%Y-%m-%d", time.gmtime(now - 86400 * i)) for i in range(CLIENT_ID_DAYS_KEPT)]
+
+def load_client_ids(sender):
+    """
+    Read the sender's client_id registry once. Returns (days, known, stale):
+    the current day keys, {client_id: message_id} for those days, and older
+    day keys to delete with the next write.
+    """
+    days = client_id_days()
+    registry = guarded_read("rtdb", chat_db.reference(f"client_ids/{sender}").get) or {}
+    known_ids = {}
+    for day in days:
+        known_ids.update(registry.get(day) or {})
+    return days, known_ids, [day for day in registry if day not in days]
+
+def find_client_id(sender, client_id):
+    """
+    Look up one client_id without downloading the registry. Returns (days,
+    message_id or None, stale): a shallow read lists the sender's day keys,
+    then only days that exist are point-read for client_id.
+    """
+    days = client_id_days()
+    stored_days = guarded_read("rtdb", lambda: chat_db.reference(f"client_ids/{sender}").get(shallow=True)) or {}
+    for day in days:
+        if day in stored_days:
+            message_id = guarded_read("rtdb", chat_db.reference(f"client_ids/{sender}/{day}/{client_id}").get)
+            if message_id:
+                return days, message_id, []
+    return days, None, [day for day in stored_days if day not in days]
+
 @one_chat_bp.route('/get_or_create_chat', methods=['POST'])
 @jwt_required()
 def get_or_create_chat():
@@ -23,18 +80,21 @@ def get_or_create_chat():
             return jsonify({"error": "Unauthorized"}), 403
 
         chat_id = f"chat_{min(user_id_1, user_id_2)}_{max(user_id_1, user_id_2)}"
-        chat_ref = realtime_db.reference(f"chats/{chat_id}")
+        chat_ref = chat_db.reference(f"chats/{chat_id}")
 
-        if chat_ref.get():
-            return jsonify({"chat_id": chat_id}), 200
+        database_url = chat_db.shard_url(chat_id)
+        if guarded_read("rtdb", chat_ref.child("users").get):
+            return jsonify({"chat_id": chat_id, "database_url": database_url}), 200
 
-        chat_ref.set({
+        guarded_write("rtdb", lambda: chat_ref.set({
             "users": [user_id_1, user_id_2],
             "messages": {},
             "last_message": None
-        })
-        return jsonify({"chat_id": chat_id}), 201
+        }))
+        return jsonify({"chat_id": chat_id, "database_url": database_url}), 201
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -47,39 +107,194 @@ def send_message():
         sender = data.get("sender")
         message = data.get("message")
 
+        client_id = data.get("client_id")
+
         if not chat_id or not sender or not message:
             return jsonify({"error": "Invalid data"}), 400
-        if len(message) > 1000:
+        if len(message) > MAX_MESSAGE_LENGTH:
             return jsonify({"error": "Message too long (max 1000 characters)"}), 400
+        if client_id is not None and (not isinstance(client_id, str) or not CLIENT_ID_RE.match(client_id)):
+            return jsonify({"error": "client_id must be 1-64 letters, digits, '-' or '_'"}), 400
 
         current_user = get_jwt_identity()
         if current_user != sender:
             return jsonify({"error": "Unauthorized"}), 403
 
-        chat_ref = realtime_db.reference(f"chats/{chat_id}")
-        chat_data = chat_ref.get()
-        if not chat_data or sender not in chat_data.get("users", []):
+        # With a client_id a retry after a timed-out send is answered from the
+        # registry instead of posting the message twice
+        if client_id:
+            days, existing_id, stale_days = find_client_id(sender, client_id)
+            if existing_id:
+                return jsonify({"success": True, "message": "Message already sent", "message_id": existing_id})
+
+        # Only the members list is needed, not the chat's messages
+        users = guarded_read("rtdb", chat_db.reference(f"chats/{chat_id}/users").get) or []
+        if sender not in users:
             return jsonify({"error": "Chat not found or unauthorized"}), 403
 
-        messages_ref = chat_ref.child("messages")
-        message_ref = messages_ref.push()
         timestamp = int(time.time() * 1000)
-        message_ref.set({
-            "sender": sender,
-            "message": message,
-            "timestamp": timestamp
-        })
-        message_id = message_ref.key
-
-        chat_ref.child("last_message").set({
+        message_id = generate_push_id(timestamp)
+        last_message = {
             "message": message,
             "sender": sender,
             "timestamp": timestamp,
             "message_id": message_id
-        })
+        }
+
+        # Message, last_message, both inbox entries and the recipients' unread
+        # counters are committed together in one multi-path update
+        updates = {
+            f"chats/{chat_id}/messages/{message_id}": {
+                "sender": sender,
+                "message": message,
+                "timestamp": timestamp
+            },
+            f"chats/{chat_id}/last_message": last_message,
+        }
+        updates.update(inbox_updates(chat_id, users, last_message))
+        for recipient in users:
+            if recipient != sender:
+                updates[f"inbox/{recipient}/{chat_id}/unread_count"] = INCREMENT_ONE
+                updates[f"unread/{recipient}/{chat_id}/count"] = INCREMENT_ONE
+        if client_id:
+            updates[f"chats/{chat_id}/messages/{message_id}"]["client_id"] = client_id
+            updates[f"client_ids/{sender}/{days[0]}/{client_id}"] = message_id
+            for day in stale_days:
+                updates[f"client_ids/{sender}/{day}"] = None
+        guarded_write("rtdb", lambda: chat_db.reference("/").update(updates))
+        message_search.add_message(users, chat_id, message_id, sender, message, timestamp)
+        analytics.record("messages", sender)
 
         return jsonify({"success": True, "message": "Message sent!", "message_id": message_id})
 
+    except WriteOutcomeUnknown as e:
+        error = "Message may not have been sent; retry with the same client_id" if client_id else str(e)
+        return jsonify({"error": error}), 503
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@one_chat_bp.route('/send_messages', methods=['POST'])
+@jwt_required()
+def send_messages_batch():
+    """
+    Ingest a queue of messages from a reconnecting client. Each item carries a
+    client-generated `client_id`; ones already stored for this sender are
+    reported as duplicates instead of being written again, and chat membership
+    is checked once per chat. Everything is written in one multi-path update.
+    """
+    try:
+        data = request.json or {}
+        items = data.get("messages")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "messages must be a non-empty list"}), 400
+        if len(items) > MAX_BATCH_MESSAGES:
+            return jsonify({"error": f"At most {MAX_BATCH_MESSAGES} messages per batch"}), 400
+
+        sender = get_jwt_identity()
+        sent, duplicates, rejected = {}, {}, []
+        pending = []
+        seen_client_ids = set()
+        repeated_in_batch = []
+
+        days, known_ids, stale_days = load_client_ids(sender)
+
+        for item in items:
+            item = item if isinstance(item, dict) else {}
+            client_id = item.get("client_id")
+            chat_id = item.get("chat_id")
+            message = item.get("message")
+
+            if not isinstance(client_id, str) or not CLIENT_ID_RE.match(client_id):
+                rejected.append({"client_id": client_id, "error": "client_id must be 1-64 letters, digits, '-' or '_'"})
+                continue
+            if client_id in seen_client_ids:
+                repeated_in_batch.append(client_id)
+                continue
+            seen_client_ids.add(client_id)
+
+            existing_id = known_ids.get(client_id)
+            if existing_id:
+                duplicates[client_id] = existing_id
+                continue
+            if not isinstance(chat_id, str) or not chat_id or not isinstance(message, str) or not message:
+                rejected.append({"client_id": client_id, "error": "Invalid data"})
+                continue
+            if len(message) > MAX_MESSAGE_LENGTH:
+                rejected.append({"client_id": client_id, "error": "Message too long (max 1000 characters)"})
+                continue
+            pending.append((client_id, chat_id, message))
+
+        # Membership is read once per distinct chat, and only the users list
+        chat_members = {}
+        for chat_id in dict.fromkeys(chat_id for _, chat_id, _ in pending):
+            chat_members[chat_id] = guarded_read("rtdb", chat_db.reference(f"chats/{chat_id}/users").get) or []
+
+        updates = {}
+        last_messages = {}
+        new_counts = {}
+        written = []
+        for client_id, chat_id, message in pending:
+            users = chat_members[chat_id]
+            if sender not in users:
+                rejected.append({"client_id": client_id, "error": "Chat not found or unauthorized"})
+                continue
+
+            timestamp = int(time.time() * 1000)
+            message_id = generate_push_id(timestamp)
+            updates[f"chats/{chat_id}/messages/{message_id}"] = {
+                "sender": sender,
+                "message": message,
+                "timestamp": timestamp,
+                "client_id": client_id
+            }
+            last_messages[chat_id] = {
+                "message": message,
+                "sender": sender,
+                "timestamp": timestamp,
+                "message_id": message_id
+            }
+            updates[f"client_ids/{sender}/{days[0]}/{client_id}"] = message_id
+            new_counts[chat_id] = new_counts.get(chat_id, 0) + 1
+            sent[client_id] = message_id
+            written.append((users, chat_id, message_id, message, timestamp))
+
+        for chat_id, last_message in last_messages.items():
+            users = chat_members[chat_id]
+            updates[f"chats/{chat_id}/last_message"] = last_message
+            updates.update(inbox_updates(chat_id, users, last_message))
+            increment = {".sv": {"increment": new_counts[chat_id]}}
+            for recipient in users:
+                if recipient != sender:
+                    updates[f"inbox/{recipient}/{chat_id}/unread_count"] = increment
+                    updates[f"unread/{recipient}/{chat_id}/count"] = increment
+
+        # A client_id repeated within the batch shares the first item's outcome
+        for client_id in repeated_in_batch:
+            if client_id in sent or client_id in duplicates:
+                duplicates[client_id] = sent.get(client_id) or duplicates[client_id]
+            else:
+                rejected.append({"client_id": client_id, "error": "Duplicate client_id in batch"})
+
+        if updates:
+            for day in stale_days:
+                updates[f"client_ids/{sender}/{day}"] = None
+            guarded_write("rtdb", lambda: chat_db.reference("/").update(updates))
+            for users, chat_id, message_id, message, timestamp in written:
+                message_search.add_message(users, chat_id, message_id, sender, message, timestamp)
+            if written:
+                analytics.record("messages", sender, count=len(written))
+
+        return jsonify({
+            "success": True,
+            "sent": sent,
+            "duplicates": duplicates,
+            "rejected": rejected
+        })
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -91,16 +306,16 @@ def get_messages():
         if not chat_id:
             return jsonify({"error": "Chat ID is required"}), 400
 
-        chat_ref = realtime_db.reference(f"chats/{chat_id}")
-        chat_data = chat_ref.get()
-        if not chat_data:
+        chat_ref = chat_db.reference(f"chats/{chat_id}")
+        users = guarded_read("rtdb", chat_ref.child("users").get)
+        if not users:
             return jsonify({"error": "Chat not found"}), 404
 
         current_user = get_jwt_identity()
-        if current_user not in chat_data.get("users", []):
+        if current_user not in users:
             return jsonify({"error": "Unauthorized"}), 403
 
-        messages_ref = chat_ref.child("messages").get()
+        messages_ref = guarded_read("rtdb", chat_ref.child("messages").get)
         if not messages_ref:
             return jsonify({"messages": []})
 
@@ -117,6 +332,78 @@ def get_messages():
 
         return jsonify({"chat_id": chat_id, "messages": messages_list})
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def export_lines(chat_id):
+    """Yield a chat's messages as NDJSON lines, reading them in key-ordered chunks."""
+    messages_ref = chat_db.reference(f"chats/{chat_id}/messages")
+    last_key = None
+    try:
+        while True:
+            query = messages_ref.order_by_key()
+            if last_key is not None:
+                query = query.start_at(last_key)
+            # One extra row when resuming, because start_at includes last_key
+            page_size = EXPORT_CHUNK_SIZE + (1 if last_key is not None else 0)
+            chunk = guarded_read("rtdb", query.limit_to_first(page_size).get) or {}
+
+            rows = [(key, msg) for key, msg in chunk.items() if key != last_key]
+            for message_id, msg in rows:
+                yield json.dumps({
+                    "message_id": message_id,
+                    "sender": msg.get("sender"),
+                    "message": msg.get("message"),
+                    "timestamp": msg.get("timestamp")
+                }) + "\n"
+            if len(rows) < EXPORT_CHUNK_SIZE:
+                return
+            last_key = rows[-1][0]
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        yield json.dumps({"error": str(e)}) + "\n"
+
+def gzip_stream(lines):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for line in lines:
+        data = compressor.compress(line.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@one_chat_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_chat():
+    try:
+        chat_id = request.args.get("chat_id")
+        if not chat_id:
+            return jsonify({"error": "Chat ID is required"}), 400
+
+        users = guarded_read("rtdb", chat_db.reference(f"chats/{chat_id}/users").get)
+        if not users:
+            return jsonify({"error": "Chat not found"}), 404
+
+        current_user = get_jwt_identity()
+        if current_user not in users:
+            return jsonify({"error": "Unauthorized"}), 403
+
+        if request.args.get("gzip") in ("1", "true"):
+            body = gzip_stream(export_lines(chat_id))
+            mimetype = "application/gzip"
+            filename = f"{chat_id}.ndjson.gz"
+        else:
+            body = export_lines(chat_id)
+            mimetype = "application/x-ndjson"
+            filename = f"{chat_id}.ndjson"
+
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -131,42 +418,175 @@ def delete_message():
         if not chat_id or not message_id:
             return jsonify({"error": "Chat ID and Message ID are required"}), 400
 
-        chat_ref = realtime_db.reference(f"chats/{chat_id}")
-        chat_data = chat_ref.get()
-        if not chat_data:
+        chat_ref = chat_db.reference(f"chats/{chat_id}")
+        # Only the members list, not every message in the chat
+        users = guarded_read("rtdb", chat_ref.child("users").get)
+        if not users:
             return jsonify({"error": "Chat not found"}), 404
 
         current_user = get_jwt_identity()
-        if current_user not in chat_data.get("users", []):
+        if current_user not in users:
             return jsonify({"error": "Unauthorized"}), 403
 
         messages_ref = chat_ref.child("messages")
-        message_data = messages_ref.child(message_id).get()
+        message_data = guarded_read("rtdb", messages_ref.child(message_id).get)
         if not message_data:
             return jsonify({"error": "Message not found"}), 404
 
         if message_data["sender"] != current_user:
             return jsonify({"error": "You can only delete your own messages"}), 403
 
-        messages_ref.child(message_id).delete()
+        guarded_write("rtdb", messages_ref.child(message_id).delete)
+        message_search.remove_message(users, chat_id, message_id)
 
         last_message_ref = chat_ref.child("last_message")
-        last_message = last_message_ref.get()
+        last_message = guarded_read("rtdb", last_message_ref.get)
         if last_message and last_message.get("message_id") == message_id:
-            all_messages = messages_ref.get()
-            if all_messages:
-                sorted_messages = sorted(all_messages.items(), key=lambda x: x[1]["timestamp"], reverse=True)
-                new_last_message = sorted_messages[0][1]
-                last_message_ref.set({
-                    "message": new_last_message["message"],
-                    "sender": new_last_message["sender"],
-                    "timestamp": new_last_message["timestamp"],
-                    "message_id": sorted_messages[0][0]
-                })
+            # Push-id keys sort by time, so the newest remaining message is the last key
+            newest = guarded_read("rtdb", messages_ref.order_by_key().limit_to_last(1).get)
+            if newest:
+                new_last_id, new_last_data = next(iter(newest.items()))
+                new_last_message = {
+                    "message": new_last_data["message"],
+                    "sender": new_last_data["sender"],
+                    "timestamp": new_last_data["timestamp"],
+                    "message_id": new_last_id
+                }
             else:
-                last_message_ref.delete()
+                new_last_message = None
+
+            updates = {f"chats/{chat_id}/last_message": new_last_message}
+            updates.update(inbox_updates(chat_id, users, new_last_message))
+            guarded_write("rtdb", lambda: chat_db.reference("/").update(updates))
 
         return jsonify({"success": True, "message": "Message deleted successfully"})
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+def inbox_page(user_id, limit, cursor=None):
+    """
+    Up to `limit` inbox entries as (updated_at, chat_id, entry), newest first,
+    strictly older than `cursor` ((updated_at, chat_id) of the last entry of
+    the previous page). The Admin SDK has no end_at(value, key), so the
+    cursor's timestamp is read inclusively and entries already returned are
+    dropped; if ties at that timestamp fill the window it is widened.
+    """
+    window = limit + 1 if cursor else limit
+    while True:
+        query = chat_db.reference(f"inbox/{user_id}").order_by_child("updated_at")
+        if cursor:
+            query = query.end_at(cursor[0])
+        entries = guarded_read("rtdb", query.limit_to_last(window).get) or {}
+
+        rows = sorted(
+            ((entry.get("updated_at", 0), chat_id, entry) for chat_id, entry in entries.items()),
+            key=lambda row: (row[0], row[1]),
+            reverse=True
+        )
+        if cursor:
+            rows = [row for row in rows if (row[0], row[1]) < cursor]
+        if len(rows) >= limit or len(entries) < window:
+            return rows[:limit]
+        window *= 2
+
+@one_chat_bp.route('/inbox', methods=['GET'])
+@jwt_required()
+def get_inbox():
+    try:
+        current_user = get_jwt_identity()
+        limit = max(1, min(request.args.get("limit", 20, type=int), MAX_INBOX_PAGE))
+        before = request.args.get("before", type=int)
+
+        # Newest conversations first; `before` and `before_id` are the
+        # updated_at and chat_id of the last conversation of the previous page
+        cursor = (before, request.args.get("before_id", "")) if before is not None else None
+        rows = inbox_page(current_user, limit, cursor)
+
+        conversations = [
+            {
+                "chat_id": chat_id,
+                "other_user_id": entry.get("other_user_id"),
+                "last_message": entry.get("last_message"),
+                "unread_count": entry.get("unread_count", 0),
+                "updated_at": updated_at
+            }
+            for updated_at, chat_id, entry in rows
+        ]
+
+        last = conversations[-1] if len(conversations) == limit else None
+        return jsonify({
+            "conversations": conversations,
+            "next_before": last["updated_at"] if last else None,
+            "next_before_id": last["chat_id"] if last else None
+        })
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@one_chat_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_messages():
+    try:
+        query = request.args.get("q", "").strip()
+        if not query:
+            return jsonify({"error": "Search query is required"}), 400
+        if len(query) > 200:
+            return jsonify({"error": "Search query too long"}), 400
+
+        limit = max(1, min(request.args.get("limit", 20, type=int), 50))
+        offset = max(0, request.args.get("offset", 0, type=int))
+        chat_id = request.args.get("chat_id")
+
+        current_user = get_jwt_identity()
+        hits, total = message_search.search(current_user, query, chat_id=chat_id, limit=limit, offset=offset)
+        if hits is None:
+            response = jsonify({"error": "Search index is being built, please retry shortly"})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+
+        return jsonify({"query": query, "total": total, "offset": offset, "hits": hits})
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@one_chat_bp.route('/mark_read', methods=['POST'])
+@jwt_required()
+def mark_read():
+    try:
+        data = request.json
+        chat_id = data.get("chat_id")
+        if not chat_id:
+            return jsonify({"error": "Chat ID is required"}), 400
+
+        current_user = get_jwt_identity()
+        updates = {
+            f"inbox/{current_user}/{chat_id}/unread_count": 0,
+            f"unread/{current_user}/{chat_id}/count": 0
+        }
+        # An inbox entry only exists for chats the user is in; chats from before
+        # the inbox have none yet, so check membership and create it here
+        if not guarded_read("rtdb", chat_db.reference(f"inbox/{current_user}/{chat_id}/chat_id").get):
+            users = guarded_read("rtdb", chat_db.reference(f"chats/{chat_id}/users").get) or []
+            if current_user not in users:
+                return jsonify({"error": "Chat not found or unauthorized"}), 403
+            last_message = guarded_read("rtdb", chat_db.reference(f"chats/{chat_id}/last_message").get)
+            prefix = f"inbox/{current_user}/"
+            updates.update({
+                path: value for path, value in inbox_updates(chat_id, users, last_message).items()
+                if path.startswith(prefix)
+            })
+
+        guarded_write("rtdb", lambda: chat_db.reference("/").update(updates))
+        return jsonify({"success": True})
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
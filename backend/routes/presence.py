@@ -0,0 +1,72 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from service.firebase import realtime_db
+from service.presence import presence_tracker
+from service.resilience import guarded_read, DependencyUnavailable
+
+presence_bp = Blueprint("presence", __name__)
+
+MAX_LOOKUP_IDS = 500
+
+@presence_bp.route("/heartbeat", methods=["POST"])
+@jwt_required()
+def heartbeat():
+    """Record that the logged-in user is online"""
+    try:
+        presence_tracker.heartbeat(get_jwt_identity())
+        return jsonify({"success": True}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@presence_bp.route("/offline", methods=["POST"])
+@jwt_required()
+def offline():
+    """Mark the logged-in user offline immediately (e.g. on logout or tab close)"""
+    try:
+        presence_tracker.go_offline(get_jwt_identity())
+        return jsonify({"success": True}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@presence_bp.route("/lookup", methods=["POST"])
+@jwt_required()
+def lookup_presence():
+    """Return presence for a list of user IDs in one call"""
+    try:
+        data = request.get_json() or {}
+        user_ids = data.get("user_ids")
+        if not isinstance(user_ids, list):
+            return jsonify({"error": "user_ids must be a list"}), 400
+        if len(user_ids) > MAX_LOOKUP_IDS:
+            return jsonify({"error": f"At most {MAX_LOOKUP_IDS} user IDs per lookup"}), 400
+
+        user_ids = [uid for uid in user_ids if isinstance(uid, str)]
+        return jsonify({"presence": presence_tracker.lookup(user_ids)}), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@presence_bp.route("/friends", methods=["GET"])
+@jwt_required()
+def friends_presence():
+    """Return presence for every accepted friend of the logged-in user"""
+    try:
+        user_id = get_jwt_identity()
+        friends_data = guarded_read("rtdb", realtime_db.reference(f"friends/{user_id}").get) or {}
+        friend_ids = [
+            friend_id for friend_id, friend_info in friends_data.items()
+            if isinstance(friend_info, dict) and friend_info.get("status") == "accepted"
+        ]
+        return jsonify({"presence": presence_tracker.lookup(friend_ids)}), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -1,10 +1,16 @@
-from flask import Blueprint, request, jsonify
+import os
+import re
+from flask import Blueprint, request, jsonify, send_from_directory, url_for, abort
 from service.firebase import firestore_db
+from service.avatars import store_avatar, variant_path, public_url, ImageProcessingError, MAX_UPLOAD_BYTES
+from service.resilience import guarded_read, guarded_write, DependencyUnavailable
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.jwt_verify import verify_token
 
 profile_bp = Blueprint("profile", __name__)
 
+IMAGE_NAME_RE = re.compile(r"^[0-9a-f]{64}_\d+\.webp$")
+
 
 @profile_bp.route("/get", methods=['GET'])
 @jwt_required()
@@ -15,7 +21,7 @@ def get_user_profile():
     try:
         # Fetch user data from Firestore
         user_ref = firestore_db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        user_doc = guarded_read("firestore", user_ref.get)
 
         if not user_doc.exists:
             return jsonify({"error": "User not found"}), 404
@@ -26,10 +32,12 @@ def get_user_profile():
             "display_name": user_data.get("display_name", ""),
             "username": user_data.get("username", ""),
             "email": user_data.get("email", ""),
-            "profilePic": user_data.get("profilePic", ""),
+            "profilePic": public_url(user_data.get("profilePic", "")),
             "whoami": user_data.get("whoami", "")
         }), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -50,18 +58,86 @@ def update_profile():
     if not update_data:
         return jsonify({"error": "No valid fields provided for update"}), 400
 
+    # A hand-entered picture URL replaces any uploaded thumbnails
+    if "profilePic" in update_data:
+        update_data["profilePicThumbs"] = {}
+
     try:
         # Reference to user document in Firestore
         user_ref = firestore_db.collection('users').document(user_id)
 
         # Check if user exists
-        if not user_ref.get().exists:
+        if not guarded_read("firestore", user_ref.get).exists:
             return jsonify({"error": "User not found"}), 404
 
         # Update Firestore document
-        user_ref.update(update_data)
+        guarded_write("firestore", lambda: user_ref.update(update_data))
 
         return jsonify({"msg": "Profile updated successfully", "updated_data": update_data}), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@profile_bp.route("/upload_picture", methods=['POST'])
+@jwt_required()
+def upload_profile_picture():
+    """Upload a profile picture; thumbnails are generated and stored by content hash"""
+    user_id = get_jwt_identity()
+
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES + 64 * 1024:
+        return jsonify({"error": "Image too large (max 5 MB)"}), 413
+
+    image = request.files.get("image")
+    if not image:
+        return jsonify({"error": "No image provided"}), 400
+
+    data = image.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        return jsonify({"error": "Image too large (max 5 MB)"}), 413
+
+    try:
+        user_ref = firestore_db.collection('users').document(user_id)
+        if not guarded_read("firestore", user_ref.get).exists:
+            return jsonify({"error": "User not found"}), 404
+
+        content_hash, names = store_avatar(data)
+        thumbs = {
+            str(size): url_for("profile.serve_image", name=name)
+            for size, name in names.items()
+        }
+        update_data = {
+            "profilePic": thumbs[str(max(names))],
+            "profilePicThumbs": thumbs
+        }
+        guarded_write("firestore", lambda: user_ref.update(update_data))
+
+        return jsonify({
+            "msg": "Profile picture updated successfully",
+            "updated_data": {
+                "profilePic": public_url(update_data["profilePic"]),
+                "profilePicThumbs": {size: public_url(url) for size, url in thumbs.items()}
+            }
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImageProcessingError as e:
+        return jsonify({"error": str(e)}), 503
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+@profile_bp.route("/images/<name>", methods=['GET'])
+def serve_image(name):
+    """Serve an immutable, content-addressed thumbnail"""
+    if not IMAGE_NAME_RE.match(name):
+        abort(404)
+    path = variant_path(name)
+    response = send_from_directory(os.path.dirname(path), name, mimetype="image/webp", max_age=31536000)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
@@ -1,6 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from service.firebase import firestore_db
+from service.random_chat_log import random_chat_log_writer
+from service.random_matcher import random_matcher
+from service.avatars import thumbnail_url, public_url, MODAL_SIZE
+from service.user_filter import user_exists
+from service.resilience import guarded_read, DependencyUnavailable
 from datetime import datetime
 
 random_chat_bp = Blueprint("random_chat", __name__)
@@ -20,18 +25,96 @@ def log_random_chat():
 
         if not other_user_id or not other_username:
             return jsonify({"error": "Missing required user information."}), 400
+        if not isinstance(other_user_id, str) or not other_user_id.isalnum() or other_user_id == user_id:
+            return jsonify({"error": "Invalid user ID."}), 400
 
-        history_ref = firestore_db.collection("random_chat_history").document(user_id)
-        history_doc = history_ref.collection("sessions").document()
-        history_doc.set({
-            "other_user_id": other_user_id,
-            "other_username": other_username,
-            "other_display_name": other_display_name,
-            "other_profile_pic": other_profile_pic,
-            "ended_at": ended_at
-        })
+        session_id = data.get("session_id")
+        if session_id is not None and (not isinstance(session_id, str) or not session_id.isalnum()):
+            return jsonify({"error": "Invalid session ID."}), 400
+        if not user_exists(other_user_id):
+            return jsonify({"error": "User not found"}), 404
+
+        # Only a pairing this server made is mirrored into the other user's
+        # history, under the server's session ID. Anything else is written to
+        # the caller's own history only, so a client-chosen ID or user cannot
+        # touch someone else's documents.
+        paired_session_id = random_matcher.session_for(user_id, other_user_id)
+        queued = random_chat_log_writer.enqueue(
+            user_id,
+            other_user_id,
+            {
+                "other_username": other_username,
+                "other_display_name": other_display_name,
+                "other_profile_pic": other_profile_pic
+            },
+            ended_at,
+            session_id=paired_session_id or session_id,
+            mirror=paired_session_id is not None
+        )
+        if not queued:
+            response = jsonify({"error": "Chat history is busy, please retry shortly."})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+
+        return jsonify({"message": "Chat session logged successfully."}), 202
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@random_chat_bp.route("/match/join", methods=["POST"])
+@jwt_required()
+def join_match():
+    """Enter the random chat waiting room, optionally matching on shared interests"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        mode = data.get("mode", "random")
+        if mode not in ("random", "interests"):
+            return jsonify({"error": "Mode must be 'random' or 'interests'."}), 400
+
+        whoami = ""
+        if mode == "interests":
+            user_doc = guarded_read("firestore", firestore_db.collection("users").document(user_id).get)
+            if not user_doc.exists:
+                return jsonify({"error": "User not found"}), 404
+            whoami = user_doc.to_dict().get("whoami", "")
+
+        partner_id = random_matcher.join(user_id, whoami, use_interests=(mode == "interests"))
+        if partner_id:
+            return jsonify({"status": "matched", "partner_id": partner_id}), 200
+        return jsonify({"status": "waiting"}), 200
+
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-        return jsonify({"message": "Chat session logged successfully."}), 200
+
+@random_chat_bp.route("/match/status", methods=["GET"])
+@jwt_required()
+def match_status():
+    """Poll for a partner while waiting"""
+    try:
+        status, partner_id = random_matcher.poll(get_jwt_identity())
+        response = {"status": status}
+        if partner_id:
+            response["partner_id"] = partner_id
+        return jsonify(response), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@random_chat_bp.route("/match/leave", methods=["POST"])
+@jwt_required()
+def leave_match():
+    """Leave the waiting room"""
+    try:
+        random_matcher.leave(get_jwt_identity())
+        return jsonify({"message": "Left the waiting room."}), 200
 
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -45,15 +128,18 @@ def get_random_chat_history():
         sessions_ref = firestore_db.collection("random_chat_history").document(user_id).collection("sessions")
         
         # Correct the order_by usage
-        sessions = sessions_ref.order_by("ended_at", direction="DESCENDING").stream()
+        sessions = guarded_read("firestore", sessions_ref.order_by("ended_at", direction="DESCENDING").get)
 
         history = []
         for session in sessions:
             session_data = session.to_dict()
+            session_data["other_profile_pic"] = public_url(session_data.get("other_profile_pic"))
             history.append(session_data)
 
         return jsonify(history), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
@@ -64,7 +150,7 @@ def get_random_chat_history():
 def get_public_profile(user_id):
     try:
         user_ref = firestore_db.collection("users").document(user_id)
-        user_doc = user_ref.get()
+        user_doc = guarded_read("firestore", user_ref.get)
 
         if not user_doc.exists:
             return jsonify({"error": "User not found"}), 404
@@ -73,11 +159,13 @@ def get_public_profile(user_id):
         public_info = {
             "username": user_data.get("username"),
             "display_name": user_data.get("display_name"),
-            "profilePic": user_data.get("profilePic"),
+            "profilePic": thumbnail_url(user_data, MODAL_SIZE),
             "whoami": user_data.get("whoami")
         }
 
         return jsonify(public_info), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -0,0 +1,146 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import has_request_context, request
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # uploads are rejected until Pillow is installed
+    Image = None
+
+# Square variants: lists/search, profile modal, full profile page
+THUMBNAIL_SIZES = (96, 256, 512)
+LIST_SIZE = 96
+MODAL_SIZE = 256
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+
+# Thumbnail URLs are stored as paths; this (or the request's own origin) is
+# prepended when they are sent to clients
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "").rstrip("/")
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(os.path.dirname(os.path.dirname(__file__)), "media"))
+AVATAR_DIR = os.path.join(MEDIA_ROOT, "avatars")
+
+
+class ImageProcessingError(RuntimeError):
+    """Thumbnails could not be produced for a reason other than a bad image."""
+
+
+def render_thumbnails(data):
+    """
+    Decode an uploaded image and return {size: webp bytes} for every thumbnail
+    size. Runs in a worker process, so it must stay a plain module-level function.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(io.BytesIO(data)) as img:
+        # Let the JPEG decoder downscale while decoding when it can
+        img.draft("RGB", (max(THUMBNAIL_SIZES) * 2, max(THUMBNAIL_SIZES) * 2))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        side = min(img.size)
+        img = ImageOps.fit(img, (side, side), method=Image.LANCZOS)
+
+        variants = {}
+        for size in sorted(THUMBNAIL_SIZES, reverse=True):
+            img = img.resize((size, size), Image.LANCZOS) if img.size[0] > size else img
+            out = io.BytesIO()
+            img.save(out, format="WEBP", quality=80, method=4)
+            variants[size] = out.getvalue()
+        return variants
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn, never fork: the pool starts lazily from a request thread of a
+            # process that already holds gRPC channels and listener threads
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, min(4, os.cpu_count() or 1)),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool(pool, kill=False):
+    """Drop a broken or stuck pool so the next upload starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    if kill:
+        # A render that overran cannot be cancelled; stop its worker instead
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def variant_name(content_hash, size):
+    return f"{content_hash}_{size}.webp"
+
+
+def variant_path(name):
+    return os.path.join(AVATAR_DIR, name[:2], name)
+
+
+def store_avatar(data, timeout=20):
+    """
+    Store thumbnails for an uploaded image under its SHA-256, so identical
+    uploads are processed and stored once. Returns (content_hash, {size: name}).
+    Raises ValueError for images Pillow cannot decode, and ImageProcessingError
+    when rendering took longer than `timeout` or a worker process died.
+    """
+    if Image is None:
+        raise RuntimeError("Image processing is not available (Pillow is not installed)")
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    names = {size: variant_name(content_hash, size) for size in THUMBNAIL_SIZES}
+    if all(os.path.exists(variant_path(name)) for name in names.values()):
+        return content_hash, names
+
+    pool = _get_pool()
+    try:
+        variants = pool.submit(render_thumbnails, data).result(timeout=timeout)
+    except TimeoutError as e:
+        # Checked before OSError, which TimeoutError subclasses
+        _reset_pool(pool, kill=True)
+        raise ImageProcessingError("Image took too long to process") from e
+    except BrokenProcessPool as e:
+        _reset_pool(pool)
+        raise ImageProcessingError("Image processing failed, please try again") from e
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Unsupported or corrupt image: {e}") from e
+
+    for size, blob in variants.items():
+        path = variant_path(names[size])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+    return content_hash, names
+
+
+def public_url(url):
+    """Absolute URL for a stored picture; stored thumbnails are host-relative paths."""
+    if not url or not url.startswith("/"):
+        return url or ""
+    if MEDIA_BASE_URL:
+        return MEDIA_BASE_URL + url
+    if has_request_context():
+        return request.host_url.rstrip("/") + url
+    return url
+
+
+def thumbnail_url(user_data, size=LIST_SIZE):
+    """Best picture URL for `size`: the stored thumbnail if any, else the legacy profilePic."""
+    thumbs = user_data.get("profilePicThumbs") or {}
+    return public_url(thumbs.get(str(size)) or user_data.get("profilePic", ""))
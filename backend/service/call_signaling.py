@@ -0,0 +1,208 @@
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+from service.firebase import firestore_db
+from service.users import get_user_profiles
+
+
+class CallError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Connection:
+    """One authenticated event stream (a browser tab) for a user."""
+
+    def __init__(self, user_id, max_pending=256):
+        self.user_id = user_id
+        self.events = queue.Queue(maxsize=max_pending)
+
+    def send(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            pass  # a stalled client must not block the relay for everyone else
+
+
+class CallHub:
+    """
+    In-process WebRTC signaling.
+
+    Users hold an event stream open; offers, answers and ICE candidates are
+    put straight onto the other peer's stream(s) without touching a database.
+    Call sessions live in memory, unanswered calls time out after
+    `ring_timeout` seconds, and one history record per participant is written
+    when a call finishes. Both peers must be connected to the same process.
+    """
+
+    def __init__(self, ring_timeout=30.0):
+        self.ring_timeout = ring_timeout
+        self._lock = threading.Lock()
+        self._connections = {}   # uid -> set of Connection
+        self._calls = {}         # call_id -> session dict
+        self._active = {}        # uid -> call_id while ringing or in a call
+        self._history_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="call-history")
+
+    # --- connections -------------------------------------------------------
+
+    def connect(self, user_id):
+        conn = Connection(user_id)
+        with self._lock:
+            self._connections.setdefault(user_id, set()).add(conn)
+        return conn
+
+    def disconnect(self, conn):
+        with self._lock:
+            conns = self._connections.get(conn.user_id)
+            if conns is None:
+                return
+            conns.discard(conn)
+            if conns:
+                return
+            del self._connections[conn.user_id]
+            call_id = self._active.get(conn.user_id)
+        # Last stream gone: the user can no longer take part in their call
+        if call_id:
+            self._finish(call_id, conn.user_id, "disconnected")
+
+    def _send(self, user_id, event):
+        for conn in list(self._connections.get(user_id, ())):
+            conn.send(event)
+
+    def is_online(self, user_id):
+        with self._lock:
+            return user_id in self._connections
+
+    # --- call lifecycle ----------------------------------------------------
+
+    def _session_for(self, user_id, call_id):
+        session = self._calls.get(call_id)
+        if session is None or user_id not in (session["caller"], session["callee"]):
+            raise CallError("Call not found", 404)
+        return session
+
+    @staticmethod
+    def _peer(session, user_id):
+        return session["callee"] if user_id == session["caller"] else session["caller"]
+
+    def start_call(self, caller, callee, offer):
+        if caller == callee:
+            raise CallError("Cannot call yourself")
+        with self._lock:
+            if callee not in self._connections:
+                raise CallError("User is not available", 404)
+            if caller in self._active or callee in self._active:
+                raise CallError("User is busy", 409)
+
+            call_id = uuid.uuid4().hex
+            session = {
+                "call_id": call_id,
+                "caller": caller,
+                "callee": callee,
+                "state": "ringing",
+                "started_at": time.time(),
+                "answered_at": None,
+                "timer": threading.Timer(self.ring_timeout, self._ring_timeout, args=(call_id,)),
+            }
+            session["timer"].daemon = True
+            self._calls[call_id] = session
+            self._active[caller] = call_id
+            self._active[callee] = call_id
+            self._send(callee, {"type": "incoming_call", "call_id": call_id, "from": caller, "offer": offer})
+        session["timer"].start()
+        return call_id
+
+    def answer(self, user_id, call_id, answer):
+        with self._lock:
+            session = self._session_for(user_id, call_id)
+            if user_id != session["callee"] or session["state"] != "ringing":
+                raise CallError("Call cannot be answered", 409)
+            session["state"] = "active"
+            session["answered_at"] = time.time()
+            session["timer"].cancel()
+            self._send(session["caller"], {"type": "call_answered", "call_id": call_id, "answer": answer})
+
+    def relay_candidate(self, user_id, call_id, candidate):
+        with self._lock:
+            session = self._session_for(user_id, call_id)
+            self._send(self._peer(session, user_id), {
+                "type": "ice_candidate", "call_id": call_id, "candidate": candidate
+            })
+
+    def reject(self, user_id, call_id):
+        with self._lock:
+            session = self._session_for(user_id, call_id)
+            if user_id != session["callee"] or session["state"] != "ringing":
+                raise CallError("Call cannot be rejected", 409)
+        self._finish(call_id, user_id, "rejected")
+
+    def end(self, user_id, call_id):
+        with self._lock:
+            self._session_for(user_id, call_id)
+        self._finish(call_id, user_id, None)
+
+    def _ring_timeout(self, call_id):
+        self._finish(call_id, None, "missed")
+
+    def _finish(self, call_id, ended_by, reason):
+        with self._lock:
+            session = self._calls.pop(call_id, None)
+            if session is None:
+                return
+            session["timer"].cancel()
+            for uid in (session["caller"], session["callee"]):
+                if self._active.get(uid) == call_id:
+                    del self._active[uid]
+
+            if reason is None:
+                reason = "completed" if session["state"] == "active" else "cancelled"
+            event = {"type": "call_ended", "call_id": call_id, "reason": reason}
+            for uid in (session["caller"], session["callee"]):
+                if uid != ended_by:
+                    self._send(uid, event)
+
+        session["ended_at"] = time.time()
+        session["status"] = reason
+        self._history_writer.submit(self._write_history, session)
+
+    # --- history -----------------------------------------------------------
+
+    @staticmethod
+    def _iso(ts):
+        return datetime.fromtimestamp(ts, UTC).isoformat() if ts else None
+
+    def _write_history(self, session):
+        """One Firestore batch with a record for each participant."""
+        try:
+            caller, callee = session["caller"], session["callee"]
+            profiles = get_user_profiles([caller, callee])
+            duration = int(session["ended_at"] - session["answered_at"]) if session["answered_at"] else 0
+
+            batch = firestore_db.batch()
+            for uid, other, direction in ((caller, callee, "outgoing"), (callee, caller, "incoming")):
+                other_data = profiles.get(other, {})
+                batch.set(
+                    firestore_db.collection("call_history").document(uid)
+                    .collection("calls").document(session["call_id"]),
+                    {
+                        "other_user_id": other,
+                        "other_username": other_data.get("username"),
+                        "other_display_name": other_data.get("display_name"),
+                        "direction": direction,
+                        "status": session["status"],
+                        "started_at": self._iso(session["started_at"]),
+                        "answered_at": self._iso(session["answered_at"]),
+                        "ended_at": self._iso(session["ended_at"]),
+                        "duration_seconds": duration
+                    }
+                )
+            batch.commit()
+        except Exception as e:
+            print("Failed to write call history:", str(e))
+
+
+call_hub = CallHub()
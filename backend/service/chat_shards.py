@@ -0,0 +1,161 @@
+import argparse
+import bisect
+import hashlib
+from service.firebase import realtime_db, DATABASE_URL, CHAT_DATABASE_URLS
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes. Adding an instance only moves the
+    chats that land on its new points (about 1/N of them), which keeps
+    rebalancing cheap.
+    """
+
+    def __init__(self, nodes, vnodes=128):
+        self.nodes = list(dict.fromkeys(nodes))
+        if not self.nodes:
+            raise ValueError("At least one database URL is required")
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+class MultiShardRoot:
+    """Root reference whose multi-path update() is split per database instance."""
+
+    def __init__(self, sharded):
+        self.sharded = sharded
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError("Value argument must be a non-empty dictionary.")
+        groups = {}
+        for path, child_value in value.items():
+            groups.setdefault(self.sharded.url_for_path(path), {})[path] = child_value
+        # Chat data first, then the default instance (inbox/unread), so a partial
+        # failure leaves at worst a stale inbox entry rather than a phantom one
+        for url in sorted(groups, key=lambda u: u == self.sharded.default_url):
+            self.sharded._reference("/", url).update(groups[url])
+
+
+class ShardedRealtimeDb:
+    """
+    Drop-in for the RTDB module that stores `chats/{chat_id}/...` on the
+    instance chosen by a consistent hash of chat_id. Every other path, and
+    the whole tree when only one instance is configured, stays on the default
+    database. Multi-path updates are atomic per instance, not across them.
+    """
+
+    def __init__(self, base, default_url, chat_urls):
+        self.base = base
+        self.default_url = default_url.rstrip("/")
+        self.ring = HashRing([url.rstrip("/") for url in (chat_urls or [default_url])])
+
+    def shard_url(self, chat_id):
+        return self.ring.node_for(chat_id)
+
+    def url_for_path(self, path):
+        parts = [part for part in path.strip("/").split("/") if part]
+        if len(parts) >= 2 and parts[0] == "chats":
+            return self.shard_url(parts[1])
+        return self.default_url
+
+    def _reference(self, path, url):
+        if url == self.default_url:
+            return self.base.reference(path)
+        return self.base.reference(path, url=url)
+
+    def reference(self, path="/"):
+        if not path.strip("/"):
+            return MultiShardRoot(self)
+        return self._reference(path, self.url_for_path(path))
+
+
+chat_db = ShardedRealtimeDb(realtime_db, DATABASE_URL, CHAT_DATABASE_URLS)
+
+
+def _copy_chat(chat_id, source, target):
+    """
+    Merge a chat from source into target without replacing anything already on
+    target: messages are written key by key, last_message only if newer.
+    Returns the message IDs copied.
+    """
+    data = realtime_db.reference(f"chats/{chat_id}", url=source).get() or {}
+    messages = data.pop("messages", None) or {}
+    last_message = data.pop("last_message", None)
+
+    updates = {f"messages/{message_id}": msg for message_id, msg in messages.items()}
+    updates.update(data)
+    if last_message:
+        current = realtime_db.reference(f"chats/{chat_id}/last_message", url=target).get()
+        if not current or current.get("timestamp", 0) <= last_message.get("timestamp", 0):
+            updates["last_message"] = last_message
+    if updates:
+        realtime_db.reference(f"chats/{chat_id}", url=target).update(updates)
+    return set(messages)
+
+
+def _move_chat(chat_id, source, target):
+    """
+    Copy, verify against the target, then delete from source only what was
+    verified. Messages written to source mid-move stay there (and are picked up
+    by the next run) instead of being lost. Returns how many were left behind.
+    """
+    copied = _copy_chat(chat_id, source, target)
+    on_target = set(realtime_db.reference(f"chats/{chat_id}/messages", url=target).get(shallow=True) or {})
+    verified = copied & on_target
+
+    deletes = {f"messages/{message_id}": None for message_id in verified}
+    deletes.update({"users": None, "last_message": None})
+    realtime_db.reference(f"chats/{chat_id}", url=source).update(deletes)
+
+    remaining = realtime_db.reference(f"chats/{chat_id}/messages", url=source).get(shallow=True) or {}
+    return len(remaining)
+
+
+def rebalance(old_urls, new_urls, dry_run=True):
+    """
+    Move every chat whose owner differs between the old and new rings.
+    Returns (chat_id, source, target, messages left on source) per move.
+
+    Safe to run while the app already writes through the new ring: copies are
+    merged into the target, and only messages verified on the target are
+    deleted from the source. Writes still going to the old ring can leave
+    messages behind; re-run until nothing is left.
+    """
+    old_ring, new_ring = HashRing(old_urls), HashRing(new_urls)
+    moves = []
+    for url in old_ring.nodes:
+        chat_ids = realtime_db.reference("chats", url=url).get(shallow=True) or {}
+        for chat_id in chat_ids:
+            source, target = url, new_ring.node_for(chat_id)
+            if source == target:
+                continue
+            left = 0 if dry_run else _move_chat(chat_id, source, target)
+            moves.append((chat_id, source, target, left))
+    return moves
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move chats after changing CHAT_DATABASE_URLS")
+    parser.add_argument("--old", required=True, help="comma-separated database URLs before the change")
+    parser.add_argument("--new", required=True, help="comma-separated database URLs after the change")
+    parser.add_argument("--apply", action="store_true", help="actually move data (default is a dry run)")
+    args = parser.parse_args()
+
+    moved = rebalance(
+        [url.strip().rstrip("/") for url in args.old.split(",") if url.strip()],
+        [url.strip().rstrip("/") for url in args.new.split(",") if url.strip()],
+        dry_run=not args.apply,
+    )
+    for chat_id, source, target, left in moved:
+        print(f"{chat_id}: {source} -> {target}" + (f" ({left} message(s) left, re-run)" if left else ""))
+    print(f"{len(moved)} chat(s) {'moved' if args.apply else 'to move'}")
@@ -1,12 +1,23 @@
+import os
 import firebase_admin
 from firebase_admin import credentials, firestore , db , auth
+from dotenv import load_dotenv
 
+load_dotenv()
+
+DATABASE_URL = "https://randomchat-c08b6-default-rtdb.asia-southeast1.firebasedatabase.app/"
+
+# Extra Realtime Database instances that chats are spread across (comma-separated).
+# When unset every chat stays on the default instance.
+CHAT_DATABASE_URLS = [url.strip() for url in os.getenv("CHAT_DATABASE_URLS", "").split(",") if url.strip()]
 
 # Loads the Firebase service account key from the Json file
 cred = credentials.Certificate("serviceAccountKey.json")
 #Initializes Firebase using the provided credentials.
 firebase_admin.initialize_app(cred , {
-    "databaseURL": "https://randomchat-c08b6-default-rtdb.asia-southeast1.firebasedatabase.app/"
+    "databaseURL": DATABASE_URL,
+    # Bound every RTDB HTTP call so a slow region cannot hold threads forever
+    "httpTimeout": 10
 })
 
 
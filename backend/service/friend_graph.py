@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from service.firebase import realtime_db
+from service.resilience import guarded_read
+
+
+class _Graph:
+    """
+    Every uid is mapped to a small integer once, and each user's friends are kept
+    as a set of those integers.
+    """
+
+    def __init__(self):
+        self.ids = {}        # uid -> int
+        self.uids = []       # int -> uid
+        self.adjacency = []  # int -> set of int
+
+    def _index(self, uid):
+        idx = self.ids.get(uid)
+        if idx is None:
+            idx = len(self.uids)
+            self.ids[uid] = idx
+            self.uids.append(uid)
+            self.adjacency.append(set())
+        return idx
+
+    def add_edge(self, uid_a, uid_b):
+        a = self._index(uid_a)
+        b = self._index(uid_b)
+        self.adjacency[a].add(b)
+        self.adjacency[b].add(a)
+
+
+class FriendGraph:
+    """
+    In-memory copy of the accepted friendships stored under `friends/` in RTDB,
+    so friend-of-friend lookups never touch Firebase.
+
+    The graph is loaded with a single read on first use and kept current by this
+    process's accept hooks. Friendships accepted through other workers are not
+    seen by those hooks, so a graph older than `max_age` seconds is reloaded in
+    the background while the old one keeps answering.
+    """
+
+    def __init__(self, max_age=300.0, load_deadline=10.0):
+        self.max_age = max_age
+        self.load_deadline = load_deadline
+        self._lock = threading.Lock()
+        self._graph = None       # _Graph answering queries, None until the first load
+        self._built_at = 0.0
+        self._pending = None     # edges accepted while a load is in flight, None when idle
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="friend-graph")
+
+    def _load(self):
+        """Read the whole friends tree (outside the lock) and swap the new graph in."""
+        try:
+            friends_data = guarded_read(
+                "rtdb", realtime_db.reference("friends").get,
+                deadline=self.load_deadline, hedge_after=None
+            ) or {}
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        graph = _Graph()
+        for user_id, friends in friends_data.items():
+            for friend_id, friend_info in (friends or {}).items():
+                if isinstance(friend_info, dict) and friend_info.get("status") == "accepted":
+                    graph.add_edge(user_id, friend_id)
+
+        with self._lock:
+            for uid_a, uid_b in self._pending or ():
+                graph.add_edge(uid_a, uid_b)
+            self._pending = None
+            self._graph = graph
+            self._built_at = time.monotonic()
+        return graph
+
+    def _reload_in_background(self):
+        try:
+            self._load()
+        except Exception as e:
+            print("Failed to reload friend graph:", str(e))
+
+    def _current(self):
+        """The graph to answer from, loading or scheduling a reload as needed."""
+        with self._lock:
+            graph = self._graph
+            if graph is not None and time.monotonic() - self._built_at < self.max_age:
+                return graph
+            if self._pending is not None:
+                return graph    # a load is already in flight
+            self._pending = []
+
+        if graph is None:
+            return self._load()
+        self._loader.submit(self._reload_in_background)
+        return graph
+
+    def add_friendship(self, uid_a, uid_b):
+        """Record a newly accepted friendship (no-op until the graph is loaded)."""
+        with self._lock:
+            if self._graph is not None:
+                self._graph.add_edge(uid_a, uid_b)
+            if self._pending is not None:
+                self._pending.append((uid_a, uid_b))
+
+    def suggestions(self, uid, limit=10):
+        """Return [(uid, mutual_count), ...] for non-friends ranked by mutual friends."""
+        graph = self._current()
+        if graph is None:
+            return []
+        with self._lock:
+            idx = graph.ids.get(uid)
+            if idx is None:
+                return []
+
+            friends = graph.adjacency[idx]
+            mutual_counts = Counter()
+            for friend in friends:
+                mutual_counts.update(graph.adjacency[friend])
+
+            mutual_counts.pop(idx, None)
+            for friend in friends:
+                mutual_counts.pop(friend, None)
+
+            ranked = sorted(mutual_counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            return [(graph.uids[candidate], count) for candidate, count in ranked]
+
+
+friend_graph = FriendGraph()
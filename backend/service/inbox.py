@@ -0,0 +1,57 @@
+import argparse
+from service.firebase import realtime_db
+from service.chat_shards import chat_db
+
+
+def inbox_updates(chat_id, users, last_message):
+    """
+    Multi-path update entries that refresh every participant's inbox entry
+    (inbox/{uid}/{chat_id}) with the chat's latest message.
+    """
+    updates = {}
+    for user_id in users:
+        others = [u for u in users if u != user_id]
+        entry_path = f"inbox/{user_id}/{chat_id}"
+        updates[f"{entry_path}/chat_id"] = chat_id
+        updates[f"{entry_path}/other_user_id"] = others[0] if others else None
+        updates[f"{entry_path}/last_message"] = last_message
+        updates[f"{entry_path}/updated_at"] = last_message["timestamp"] if last_message else 0
+    return updates
+
+
+def backfill_inbox(dry_run=True):
+    """
+    Create inbox entries for chats that predate the inbox (existing entries
+    are left alone). Reads every chat once; meant to be run once after deploy.
+    Returns the (uid, chat_id) entries created.
+    """
+    created = []
+    for url in chat_db.ring.nodes:
+        chat_ids = realtime_db.reference("chats", url=url).get(shallow=True) or {}
+        for chat_id in chat_ids:
+            users = chat_db.reference(f"chats/{chat_id}/users").get() or []
+            last_message = chat_db.reference(f"chats/{chat_id}/last_message").get()
+            updates = {}
+            for user_id in users:
+                if realtime_db.reference(f"inbox/{user_id}/{chat_id}/chat_id").get():
+                    continue
+                created.append((user_id, chat_id))
+                prefix = f"inbox/{user_id}/"
+                updates.update({
+                    path: value for path, value in inbox_updates(chat_id, users, last_message).items()
+                    if path.startswith(prefix)
+                })
+            if updates and not dry_run:
+                realtime_db.reference("/").update(updates)
+    return created
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create inbox entries for chats created before the inbox existed")
+    parser.add_argument("--apply", action="store_true", help="actually write entries (default is a dry run)")
+    args = parser.parse_args()
+
+    entries = backfill_inbox(dry_run=not args.apply)
+    for user_id, chat_id in entries:
+        print(f"inbox/{user_id}/{chat_id}")
+    print(f"{len(entries)} inbox entr{'y' if len(entries) == 1 else 'ies'} {'created' if args.apply else 'to create'}")
@@ -0,0 +1,216 @@
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from service.firebase import realtime_db
+from service.chat_shards import chat_db
+from service.resilience import guarded_read
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+REPEAT_RE = re.compile(r"(.)\1{2,}")
+
+
+def tokenize(text):
+    """
+    Tokenizer tuned for short chat text: NFKC + casefold, word characters only,
+    and runs of 3+ repeated letters squashed to two ("sooooo" -> "soo").
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return [REPEAT_RE.sub(r"\1\1", token) for token in TOKEN_RE.findall(text)]
+
+
+class UserMessageIndex:
+    """Inverted index over the messages of one user's chats."""
+
+    def __init__(self):
+        self.docs = []            # doc id -> (chat_id, message_id, sender, timestamp, token_count) or None
+        self.doc_ids = {}         # (chat_id, message_id) -> doc id
+        self.postings = {}        # term -> array of doc ids, ascending
+        self.terms = []           # every term, sorted, for prefix lookups
+        self.live_count = 0
+
+    def add(self, chat_id, message_id, sender, text, timestamp):
+        key = (chat_id, message_id)
+        if key in self.doc_ids:
+            return
+        tokens = tokenize(text)
+        doc_id = len(self.docs)
+        self.docs.append((chat_id, message_id, sender, timestamp, max(len(tokens), 1)))
+        self.doc_ids[key] = doc_id
+        self.live_count += 1
+        for term in set(tokens):
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("I")
+                bisect.insort(self.terms, term)
+            postings.append(doc_id)
+
+    def remove(self, chat_id, message_id):
+        # Tombstone only; dead doc ids are skipped at query time
+        doc_id = self.doc_ids.pop((chat_id, message_id), None)
+        if doc_id is not None:
+            self.docs[doc_id] = None
+            self.live_count -= 1
+
+    def _terms_for(self, token, is_prefix):
+        if not is_prefix:
+            return [token] if token in self.postings else []
+        # The last query token also matches as a prefix ("hel" -> "hello");
+        # matching terms are one contiguous run of the sorted term list
+        start = bisect.bisect_left(self.terms, token)
+        end = start
+        while end < len(self.terms) and self.terms[end].startswith(token):
+            end += 1
+        return self.terms[start:end]
+
+    def search(self, query, chat_id=None):
+        """
+        Runs without MessageSearchIndex's lock: add() only appends and remove()
+        only tombstones, so a concurrent write at worst adds or hides a hit.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        total = max(self.live_count, 1)
+        scores = {}
+        matched_tokens = {}
+        matched_docs = {}
+        for position, token in enumerate(tokens):
+            is_prefix = position == len(tokens) - 1
+            for term in self._terms_for(token, is_prefix):
+                postings = self.postings[term]
+                idf = math.log(1 + total / len(postings))
+                for doc_id in postings:
+                    doc = self.docs[doc_id]
+                    if doc is None or (chat_id and doc[0] != chat_id):
+                        continue
+                    matched_docs[doc_id] = doc
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf / math.sqrt(doc[4])
+                    matched_tokens.setdefault(doc_id, set()).add(position)
+
+        # Every query token has to match; rank by score, newest first on ties
+        hits = [doc_id for doc_id, matched in matched_tokens.items() if len(matched) == len(tokens)]
+        hits.sort(key=lambda doc_id: (-scores[doc_id], -matched_docs[doc_id][3]))
+        return [(matched_docs[doc_id], scores[doc_id]) for doc_id in hits]
+
+
+class MessageSearchIndex:
+    """
+    Per-user message search. A user's index is built from RTDB the first time
+    they search and kept current afterwards by this process's send/delete
+    hooks. Messages sent through other workers are not seen by those hooks,
+    so an index older than `max_age` seconds is rebuilt in the background
+    while the stale one keeps answering. At most `max_users` indexes are
+    kept; the least recently searched are evicted.
+    """
+
+    def __init__(self, max_users=500, max_age=300.0):
+        self.max_users = max_users
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()   # uid -> (UserMessageIndex, built at), least recently used first
+        self._loading = {}              # uid -> list of ops queued while the index is built
+        self._builder = ThreadPoolExecutor(max_workers=4, thread_name_prefix="message-search")
+
+    def _apply(self, uid, op):
+        entry = self._indexes.get(uid)
+        if entry is not None:
+            op(entry[0])
+        if uid in self._loading:
+            self._loading[uid].append(op)
+
+    def add_message(self, users, chat_id, message_id, sender, text, timestamp):
+        with self._lock:
+            for uid in users:
+                self._apply(uid, lambda index: index.add(chat_id, message_id, sender, text, timestamp))
+
+    def remove_message(self, users, chat_id, message_id):
+        with self._lock:
+            for uid in users:
+                self._apply(uid, lambda index: index.remove(chat_id, message_id))
+
+    def _user_chat_ids(self, uid):
+        chat_ids = set((guarded_read("rtdb", lambda: realtime_db.reference(f"inbox/{uid}").get(shallow=True)) or {}).keys())
+        friends = guarded_read("rtdb", lambda: realtime_db.reference(f"friends/{uid}").get(shallow=True)) or {}
+        for friend_id in friends:
+            chat_ids.add(f"chat_{min(uid, friend_id)}_{max(uid, friend_id)}")
+        return chat_ids
+
+    def _build(self, uid):
+        index = UserMessageIndex()
+        for chat_id in sorted(self._user_chat_ids(uid)):
+            messages = guarded_read("rtdb", chat_db.reference(f"chats/{chat_id}/messages").get) or {}
+            for message_id, msg in sorted(messages.items(), key=lambda item: item[1].get("timestamp", 0)):
+                index.add(chat_id, message_id, msg.get("sender"), msg.get("message", ""), msg.get("timestamp", 0))
+        return index
+
+    def _load(self, uid):
+        """Build uid's index (outside the lock) and install it with the ops queued meanwhile."""
+        try:
+            index = self._build(uid)
+        except Exception:
+            with self._lock:
+                self._loading.pop(uid, None)
+            raise
+
+        with self._lock:
+            for op in self._loading.pop(uid, []):
+                op(index)
+            self._indexes[uid] = (index, time.monotonic())
+            self._indexes.move_to_end(uid)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _rebuild_in_background(self, uid):
+        try:
+            self._load(uid)
+        except Exception as e:
+            print("Failed to rebuild search index:", str(e))
+
+    def _get_index(self, uid):
+        with self._lock:
+            entry = self._indexes.get(uid)
+            if entry is not None:
+                self._indexes.move_to_end(uid)
+                stale = time.monotonic() - entry[1] >= self.max_age
+                if stale and uid not in self._loading:
+                    self._loading[uid] = []
+                    self._builder.submit(self._rebuild_in_background, uid)
+                return entry[0]
+            if uid in self._loading:
+                return None
+            self._loading[uid] = []
+
+        # First search for this user: nothing to answer from until it is built
+        return self._load(uid)
+
+    def search(self, uid, query, chat_id=None, limit=20, offset=0):
+        """
+        Return (hits, total) for uid, or (None, 0) while the index is still
+        being built by another request.
+        """
+        index = self._get_index(uid)
+        if index is None:
+            return None, 0
+        results = index.search(query, chat_id=chat_id)
+        hits = [
+            {
+                "chat_id": doc[0],
+                "message_id": doc[1],
+                "sender": doc[2],
+                "timestamp": doc[3],
+                "score": round(score, 4)
+            }
+            for doc, score in results[offset:offset + limit]
+        ]
+        return hits, len(results)
+
+
+message_search = MessageSearchIndex()
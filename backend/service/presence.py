@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import deque
+from service.firebase import realtime_db
+from service.resilience import guarded_read
+
+
+class PresenceTracker:
+    """
+    In-process online/offline tracking.
+
+    Heartbeats only touch an in-memory dict. A background thread walks a timer
+    wheel once per tick to expire users whose heartbeats stopped, and only the
+    resulting online/offline transitions are written to `presence/{uid}` in RTDB,
+    batched into one multi-path update per flush.
+
+    Users who heartbeat to another worker are only known through those flushed
+    transitions, so lookups for uids not online here read the users currently
+    flushed as online (one query, needs `.indexOn: "state"` on `presence`).
+    last_seen is remembered for `last_seen_retention` seconds after a user's
+    offline transition has been flushed.
+    """
+
+    def __init__(self, ttl=30, tick=1.0, wheel_size=64, flush_interval=5.0, flush_size=500,
+                 last_seen_retention=3600.0):
+        self.ttl = ttl
+        self.tick = tick
+        self.wheel_size = max(wheel_size, int(ttl / tick) + 2)
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.last_seen_retention = last_seen_retention
+
+        self._lock = threading.Lock()
+        self._deadlines = {}                  # uid -> expiry time (monotonic)
+        self._last_seen = {}                  # uid -> last heartbeat (epoch ms)
+        self._wheel = [set() for _ in range(self.wheel_size)]
+        self._current_tick = self._tick_for(time.monotonic())
+        self._transitions = {}                # uid -> state waiting to be flushed
+        self._last_flush = time.monotonic()
+        self._flushed_offline = deque()       # (flushed at, uid), oldest first
+        self._thread = None
+
+    def _tick_for(self, moment):
+        return int(moment / self.tick)
+
+    def _schedule(self, uid, deadline):
+        # Never file into a slot the expiry walk has already passed, or the uid
+        # would wait a full revolution of the wheel
+        tick = max(self._tick_for(deadline), self._current_tick)
+        self._wheel[tick % self.wheel_size].add(uid)
+
+    def _ensure_running(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="presence-tracker", daemon=True)
+            self._thread.start()
+
+    def heartbeat(self, uid):
+        """Mark uid as online; repeated heartbeats only move the expiry forward."""
+        now = time.monotonic()
+        with self._lock:
+            self._ensure_running()
+            was_online = uid in self._deadlines
+            self._deadlines[uid] = now + self.ttl
+            self._last_seen[uid] = int(time.time() * 1000)
+            if not was_online:
+                self._schedule(uid, now + self.ttl)
+                self._transitions[uid] = "online"
+
+    def go_offline(self, uid):
+        with self._lock:
+            if self._deadlines.pop(uid, None) is not None:
+                self._transitions[uid] = "offline"
+
+    def _online_elsewhere(self):
+        """{uid: last_seen} of users flushed as online to RTDB, by any worker."""
+        query = realtime_db.reference("presence").order_by_child("state").equal_to("online")
+        online = guarded_read("rtdb", query.get) or {}
+        return {uid: (entry or {}).get("last_seen") for uid, entry in online.items()}
+
+    def lookup(self, uids):
+        """
+        Return {uid: {"online": bool, "last_seen": ms or None}}: from memory for
+        users online here (or with an offline transition not yet flushed), and
+        from the flushed presence state for everyone else.
+        """
+        with self._lock:
+            result = {
+                uid: {
+                    "online": uid in self._deadlines,
+                    "last_seen": self._last_seen.get(uid)
+                }
+                for uid in uids
+            }
+            unresolved = [
+                uid for uid in result
+                if uid not in self._deadlines and uid not in self._transitions
+            ]
+        if not unresolved:
+            return result
+
+        online_elsewhere = self._online_elsewhere()
+        for uid in unresolved:
+            if uid in online_elsewhere:
+                result[uid] = {"online": True, "last_seen": online_elsewhere[uid]}
+        return result
+
+    def _expire(self, now):
+        target_tick = self._tick_for(now)
+        while self._current_tick <= target_tick:
+            slot = self._wheel[self._current_tick % self.wheel_size]
+            self._current_tick += 1
+            if not slot:
+                continue
+            due, slot_uids = [], list(slot)
+            slot.clear()
+            for uid in slot_uids:
+                deadline = self._deadlines.get(uid)
+                if deadline is None:
+                    continue
+                if deadline <= now:
+                    due.append(uid)
+                else:
+                    # Heartbeats arrived since scheduling; move to the new deadline
+                    self._schedule(uid, deadline)
+            for uid in due:
+                del self._deadlines[uid]
+                self._transitions[uid] = "offline"
+
+    def _take_transitions(self, now, force=False):
+        if not self._transitions:
+            return {}
+        if not force and len(self._transitions) < self.flush_size and now - self._last_flush < self.flush_interval:
+            return {}
+        pending = self._transitions
+        self._transitions = {}
+        self._last_flush = now
+        return pending
+
+    def flush(self, force=True):
+        """Write pending transitions to RTDB in a single multi-path update."""
+        with self._lock:
+            pending = self._take_transitions(time.monotonic(), force=force)
+            last_seen = {uid: self._last_seen.get(uid) for uid in pending}
+        if not pending:
+            return
+        updates = {
+            f"presence/{uid}": {"state": state, "last_seen": last_seen[uid]}
+            for uid, state in pending.items()
+        }
+        try:
+            realtime_db.reference("/").update(updates)
+            flushed_at = time.monotonic()
+            with self._lock:
+                self._flushed_offline.extend(
+                    (flushed_at, uid) for uid, state in pending.items() if state == "offline"
+                )
+        except Exception as e:
+            print("Presence flush failed:", str(e))
+            with self._lock:
+                # Keep newer transitions that arrived while we were writing
+                for uid, state in pending.items():
+                    self._transitions.setdefault(uid, state)
+
+    def _forget(self, now):
+        """Drop last_seen of users flushed offline more than last_seen_retention ago."""
+        while self._flushed_offline and now - self._flushed_offline[0][0] >= self.last_seen_retention:
+            _, uid = self._flushed_offline.popleft()
+            if uid not in self._deadlines and uid not in self._transitions:
+                self._last_seen.pop(uid, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                self._forget(now)
+            self.flush(force=False)
+
+
+presence_tracker = PresenceTracker()
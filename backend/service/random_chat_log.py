@@ -0,0 +1,164 @@
+import atexit
+import queue
+import threading
+import time
+import uuid
+from service.firebase import firestore_db
+
+# Firestore batches are limited to 500 writes and every session writes two documents
+MAX_SESSIONS_PER_BATCH = 200
+MAX_WRITE_ATTEMPTS = 5
+
+
+class RandomChatLogWriter:
+    """
+    Write-behind buffer for random chat session history.
+
+    Routes enqueue ended sessions and return immediately. A background thread
+    drains the bounded queue and commits sessions through Firestore batched
+    writes whenever `flush_size` sessions are waiting or `flush_interval`
+    seconds have passed. A mirrored session is written for both participants in
+    the same batch, under the same document ID, so logging it twice is
+    harmless. A failed batch goes back on the queue and is retried up to
+    `max_attempts` times.
+    """
+
+    def __init__(self, max_queue=10000, flush_size=MAX_SESSIONS_PER_BATCH, flush_interval=2.0, put_timeout=0.5,
+                 max_attempts=MAX_WRITE_ATTEMPTS, retry_delay=1.0):
+        self.flush_size = min(flush_size, MAX_SESSIONS_PER_BATCH)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.close)
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="random-chat-log", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, user_id, other_user_id, other_info, ended_at, session_id=None, mirror=False):
+        """
+        Queue a session for logging. Only `mirror` sessions (ones the server
+        paired itself) are also written into the other user's history.
+        Returns False when the buffer stays full for `put_timeout` seconds so
+        the caller can push back on the client.
+        """
+        self._ensure_running()
+        session = {
+            "session_id": session_id or uuid.uuid4().hex,
+            "user_id": user_id,
+            "other_user_id": other_user_id,
+            "other_info": other_info,
+            "ended_at": ended_at,
+            "mirror": mirror,
+            "attempts": 0,
+        }
+        try:
+            self._queue.put(session, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def _drain(self, first=None):
+        sessions = [first] if first is not None else []
+        while len(sessions) < self.flush_size:
+            try:
+                sessions.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return sessions
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Give a burst a moment to accumulate unless the batch is already full
+            deadline = time.monotonic() + self.flush_interval
+            while self._queue.qsize() < self.flush_size - 1 and time.monotonic() < deadline and not self._stop.is_set():
+                time.sleep(0.05)
+            if not self._write(self._drain(first)):
+                self._stop.wait(self.retry_delay)
+
+    def _requeue(self, sessions):
+        for s in sessions:
+            s["attempts"] += 1
+            if s["attempts"] >= self.max_attempts:
+                print(f"Dropping random chat session {s['session_id']} after {s['attempts']} failed writes")
+                continue
+            try:
+                self._queue.put_nowait(s)
+            except queue.Full:
+                print(f"Dropping random chat session {s['session_id']}: log queue is full")
+
+    def _write(self, sessions):
+        """Commit one batch; on failure requeue the sessions and return False."""
+        if not sessions:
+            return True
+        try:
+            # Loggers' profiles for the mirrored entries, in one read
+            user_ids = list(dict.fromkeys(s["user_id"] for s in sessions if s["mirror"]))
+            profiles = {}
+            if user_ids:
+                refs = [firestore_db.collection("users").document(uid) for uid in user_ids]
+                profiles = {doc.id: doc.to_dict() for doc in firestore_db.get_all(refs) if doc.exists}
+
+            batch = firestore_db.batch()
+            history = firestore_db.collection("random_chat_history")
+            for s in sessions:
+                other_info = s["other_info"]
+                batch.set(
+                    history.document(s["user_id"]).collection("sessions").document(s["session_id"]),
+                    {
+                        "other_user_id": s["other_user_id"],
+                        "other_username": other_info.get("other_username"),
+                        "other_display_name": other_info.get("other_display_name"),
+                        "other_profile_pic": other_info.get("other_profile_pic"),
+                        "ended_at": s["ended_at"]
+                    }
+                )
+                if not s["mirror"]:
+                    continue
+                user_data = profiles.get(s["user_id"], {})
+                batch.set(
+                    history.document(s["other_user_id"]).collection("sessions").document(s["session_id"]),
+                    {
+                        "other_user_id": s["user_id"],
+                        "other_username": user_data.get("username"),
+                        "other_display_name": user_data.get("display_name"),
+                        "other_profile_pic": user_data.get("profilePic"),
+                        "ended_at": s["ended_at"]
+                    }
+                )
+            batch.commit()
+            return True
+        except Exception as e:
+            print(f"Failed to write {len(sessions)} random chat session(s):", str(e))
+            self._requeue(sessions)
+            return False
+
+    def flush(self):
+        """Synchronously write everything buffered, retrying failed batches."""
+        while True:
+            sessions = self._drain()
+            if not sessions:
+                return
+            if not self._write(sessions):
+                time.sleep(self.retry_delay)
+
+    def close(self):
+        """Stop the background thread and flush what is left (registered with atexit)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+
+random_chat_log_writer = RandomChatLogWriter()
@@ -0,0 +1,208 @@
+import hashlib
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from service.analytics import analytics
+
+try:
+    import numpy as np
+except ImportError:  # interest matching degrades to plain random pairing
+    np = None
+
+VECTOR_DIM = 256
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "i",
+    "im", "in", "is", "it", "its", "me", "my", "of", "on", "or", "so", "that",
+    "the", "this", "to", "with", "you", "your", "love", "like", "really", "just",
+}
+
+
+def extract_interests(text):
+    """Pull lowercase interest tags out of a `whoami` bio (hashtags count twice)."""
+    text = (text or "").lower()
+    tags = []
+    for word in re.findall(r"[a-z0-9#+]{2,}", text):
+        tag = word.lstrip("#")
+        if len(tag) < 2 or tag in STOPWORDS:
+            continue
+        tags.append(tag)
+        if word.startswith("#"):
+            tags.append(tag)
+    return tags
+
+
+def interest_vector(text):
+    """Hash interest tags into a fixed-size, L2-normalised float32 vector."""
+    if np is None:
+        return None
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for tag in extract_interests(text):
+        bucket = int.from_bytes(hashlib.blake2b(tag.encode(), digest_size=4).digest(), "little")
+        vector[bucket % VECTOR_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+class RandomMatcher:
+    """
+    Waiting room for random chat.
+
+    Waiting users' interest vectors live in one contiguous NumPy matrix so a
+    newcomer is scored against everyone with a single matrix-vector product.
+    Users without interests (or when NumPy is missing) are paired randomly, and
+    anyone who has waited longer than `max_wait` seconds falls back to random.
+    Waiters that stop polling for `poll_ttl` seconds (closed tab, lost
+    connection) are evicted before any pairing, as are uncollected matches.
+    """
+
+    def __init__(self, min_score=0.2, max_wait=10.0, capacity=1024, session_ttl=6 * 3600, poll_ttl=15.0):
+        self.min_score = min_score
+        self.max_wait = max_wait
+        self.session_ttl = session_ttl
+        self.poll_ttl = poll_ttl
+        self._lock = threading.Lock()
+        self._uids = []          # row -> uid
+        self._rows = {}          # uid -> row
+        self._joined = []        # row -> join time (monotonic)
+        self._polled = []        # row -> last join/poll time (monotonic)
+        self._matrix = np.zeros((capacity, VECTOR_DIM), dtype=np.float32) if np is not None else None
+        self._matches = {}       # uid -> (partner uid, matched at), until the user collects it
+        self._sessions = OrderedDict()   # (uid, uid) sorted -> (session_id, paired at), oldest first
+
+    def _add(self, uid, vector):
+        row = len(self._uids)
+        if self._matrix is not None:
+            if row == self._matrix.shape[0]:
+                grown = np.zeros((row * 2, VECTOR_DIM), dtype=np.float32)
+                grown[:row] = self._matrix
+                self._matrix = grown
+            self._matrix[row] = vector if vector is not None else 0.0
+        now = time.monotonic()
+        self._uids.append(uid)
+        self._joined.append(now)
+        self._polled.append(now)
+        self._rows[uid] = row
+
+    def _remove(self, uid):
+        row = self._rows.pop(uid, None)
+        if row is None:
+            return
+        last = len(self._uids) - 1
+        if row != last:
+            # Swap the last waiting user into the freed row to keep the matrix dense
+            moved = self._uids[last]
+            self._uids[row] = moved
+            self._joined[row] = self._joined[last]
+            self._polled[row] = self._polled[last]
+            if self._matrix is not None:
+                self._matrix[row] = self._matrix[last]
+            self._rows[moved] = row
+        self._uids.pop()
+        self._joined.pop()
+        self._polled.pop()
+
+    def _evict_stale(self, now):
+        """Drop waiters and uncollected matches nobody has polled for within poll_ttl."""
+        cutoff = now - self.poll_ttl
+        for uid in [u for u, polled in zip(self._uids, self._polled) if polled < cutoff]:
+            self._remove(uid)
+        for uid in [u for u, (_, matched_at) in self._matches.items() if matched_at < cutoff]:
+            del self._matches[uid]
+
+    def _prune_sessions(self, now):
+        while self._sessions:
+            _, (_, paired_at) = next(iter(self._sessions.items()))
+            if now - paired_at < self.session_ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def _pair(self, uid, partner):
+        """Take partner out of the waiting room; they learn about uid on their next poll."""
+        now = time.monotonic()
+        self._remove(partner)
+        self._matches[partner] = (uid, now)
+        self._prune_sessions(now)
+        key = (min(uid, partner), max(uid, partner))
+        self._sessions.pop(key, None)
+        self._sessions[key] = (uuid.uuid4().hex, now)
+        # Counted here, once per pairing; both participants log the session
+        analytics.record("random_sessions", uid)
+        return partner
+
+    def session_for(self, uid, other):
+        """
+        The session ID of the most recent pairing of uid and other made by this
+        process within `session_ttl` seconds, or None if they were not paired.
+        """
+        with self._lock:
+            self._prune_sessions(time.monotonic())
+            session = self._sessions.get((min(uid, other), max(uid, other)))
+            return session[0] if session else None
+
+    def _best_interest_match(self, uid, vector):
+        count = len(self._uids)
+        if vector is None or self._matrix is None or count == 0:
+            return None
+        scores = self._matrix[:count] @ vector
+        own_row = self._rows.get(uid)
+        if own_row is not None:
+            scores[own_row] = -1.0
+        best = int(np.argmax(scores))
+        return self._uids[best] if scores[best] >= self.min_score else None
+
+    def _random_partner(self, uid):
+        candidates = [u for u in self._uids if u != uid]
+        return random.choice(candidates) if candidates else None
+
+    def join(self, uid, whoami="", use_interests=True):
+        """Try to match uid right away; otherwise leave them waiting. Returns partner or None."""
+        vector = interest_vector(whoami) if use_interests else None
+        with self._lock:
+            self._evict_stale(time.monotonic())
+            self._matches.pop(uid, None)
+            self._remove(uid)
+
+            partner = self._best_interest_match(uid, vector)
+            if partner is None and vector is None:
+                partner = self._random_partner(uid)
+            if partner is not None:
+                return self._pair(uid, partner)
+
+            self._add(uid, vector)
+            return None
+
+    def poll(self, uid):
+        """
+        Return ("matched", partner), ("waiting", None) or ("idle", None). A user
+        waiting past `max_wait` is paired with a random waiting user.
+        """
+        with self._lock:
+            now = time.monotonic()
+            match = self._matches.pop(uid, None)
+            if match is not None:
+                return "matched", match[0]
+
+            row = self._rows.get(uid)
+            if row is None:
+                return "idle", None
+            self._polled[row] = now
+            self._evict_stale(now)
+            row = self._rows[uid]
+
+            if now - self._joined[row] >= self.max_wait:
+                partner = self._random_partner(uid)
+                if partner is not None:
+                    self._remove(uid)
+                    return "matched", self._pair(uid, partner)
+            return "waiting", None
+
+    def leave(self, uid):
+        with self._lock:
+            self._remove(uid)
+            self._matches.pop(uid, None)
+
+
+random_matcher = RandomMatcher()
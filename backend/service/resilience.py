@@ -0,0 +1,198 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from firebase_admin import exceptions as firebase_exceptions
+from google.api_core import exceptions as google_exceptions
+
+
+class DependencyUnavailable(Exception):
+    """Raised when a Firebase call timed out, kept failing, or its circuit is open."""
+
+
+class WriteOutcomeUnknown(DependencyUnavailable):
+    """A write overran its deadline and may still be applied; only an idempotent retry is safe."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker. After `failure_threshold`
+    consecutive failures calls fail fast for `reset_timeout` seconds, then a
+    single trial call decides whether to close again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "timeouts": 0, "retries": 0, "hedges": 0}
+
+    def allow(self):
+        with self._lock:
+            self._stats["calls"] += 1
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, timeout=False):
+        with self._lock:
+            self._failures += 1
+            self._stats["failures"] += 1
+            if timeout:
+                self._stats["timeouts"] += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                **self._stats
+            }
+
+
+# Calls run on a pool per backend so a deadline can be enforced on blocking SDK
+# calls. A call that overruns keeps its thread until the SDK's own HTTP timeout
+# fires; separate pools stop a slow backend from starving the other one.
+_executors = {
+    "firestore": ThreadPoolExecutor(max_workers=16, thread_name_prefix="firestore-call"),
+    "rtdb": ThreadPoolExecutor(max_workers=16, thread_name_prefix="rtdb-call"),
+}
+
+breakers = {
+    "firestore": CircuitBreaker("firestore"),
+    "rtdb": CircuitBreaker("rtdb"),
+}
+
+
+TRANSIENT_FIREBASE_CODES = {
+    firebase_exceptions.UNAVAILABLE,
+    firebase_exceptions.DEADLINE_EXCEEDED,
+    firebase_exceptions.INTERNAL,
+    firebase_exceptions.UNKNOWN,
+}
+
+
+def is_transient(error):
+    """Errors that say the backend is slow or unhealthy, as opposed to a bad request."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, firebase_exceptions.FirebaseError):
+        return error.code in TRANSIENT_FIREBASE_CODES
+    return isinstance(error, (
+        google_exceptions.ServerError,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.TooManyRequests,
+    ))
+
+
+def _backoff(attempt, base=0.05, cap=1.0):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _attempt(fn, breaker, timeout, hedge_after):
+    """Run fn once (plus an optional hedged duplicate) within `timeout` seconds."""
+    executor = _executors[breaker.name]
+    futures = [executor.submit(fn)]
+    start = time.monotonic()
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            breaker.count("hedges")
+            futures.append(executor.submit(fn))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+
+    for future in pending:
+        future.cancel()
+    if error is not None and not pending:
+        raise error
+    raise TimeoutError(f"{breaker.name} call exceeded {timeout:.2f}s")
+
+
+def guarded_call(backend, fn, deadline=5.0, retries=0, hedge_after=None, idempotent=True):
+    """
+    Call fn() against `backend` ("firestore" or "rtdb") with a deadline, the
+    backend's circuit breaker, optional jittered retries and optional hedging.
+    Retries and hedging must only be used for idempotent operations; a
+    non-idempotent call that times out raises WriteOutcomeUnknown.
+    """
+    breaker = breakers[backend]
+    if not breaker.allow():
+        raise DependencyUnavailable(f"{backend} circuit is open")
+
+    expires = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        remaining = expires - time.monotonic()
+        try:
+            result = _attempt(fn, breaker, remaining, hedge_after)
+            breaker.record_success()
+            return result
+        except Exception as e:
+            if not is_transient(e):
+                # The backend answered; the request itself was bad
+                breaker.record_success()
+                raise
+            timed_out = isinstance(e, TimeoutError)
+            breaker.record_failure(timeout=timed_out)
+            pause = _backoff(attempt)
+            if attempt >= retries or time.monotonic() + pause >= expires or not breaker.allow():
+                if timed_out and not idempotent:
+                    raise WriteOutcomeUnknown(f"{backend} write did not confirm in time and may still apply") from e
+                raise DependencyUnavailable(f"{backend} unavailable: {e}") from e
+            breaker.count("retries")
+            attempt += 1
+            time.sleep(pause)
+
+
+def guarded_read(backend, fn, deadline=3.0, retries=2, hedge_after=0.5):
+    """Idempotent read: deadline, jittered retries and a hedged duplicate request."""
+    return guarded_call(backend, fn, deadline=deadline, retries=retries, hedge_after=hedge_after)
+
+
+def guarded_write(backend, fn, deadline=5.0):
+    """Non-idempotent write: deadline and circuit breaking only, never retried."""
+    return guarded_call(backend, fn, deadline=deadline, idempotent=False)
+
+
+def resilience_status():
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
@@ -0,0 +1,160 @@
+import hashlib
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, UTC
+from service.firebase import firestore_db
+from service.resilience import guarded_read
+
+# Append-only feed of new uids ({"created_at": iso}), written with each users/{uid}
+USER_ID_FEED = "user_ids"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class UserExistenceFilter:
+    """
+    Answers "might this uid be a user?" without touching Firestore.
+
+    The filter is seeded from an ID-only query on `users` (no document
+    bodies are transferred), then learns about signups from a snapshot
+    listener on the append-only `user_ids` feed, which the signup routes write
+    alongside each new users/{uid} document. Profile edits therefore never
+    reach the listener. Signups and logins handled by this process are also
+    added immediately. A miss is a definite "no", a hit still needs a
+    Firestore read. Until the first seed completes, or while the listener is
+    down, every uid counts as a hit.
+    """
+
+    def __init__(self, headroom=2.0, error_rate=0.01, feed_overlap=300.0):
+        self.headroom = headroom
+        self.error_rate = error_rate
+        self.feed_overlap = feed_overlap
+        self._lock = threading.Lock()
+        self._filter = None
+        self._capacity = 0
+        self._count = 0
+        self._pending = None    # uids learned while a seed is in flight, None when idle
+        self._watch = None
+        self._seeder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-filter")
+
+    def _schedule_seed(self):
+        # Caller holds the lock
+        if self._pending is None:
+            self._pending = []
+            self._seeder.submit(self._seed)
+
+    def _seed(self):
+        """(Re)build the filter from every uid in `users`, sized with headroom."""
+        try:
+            uids = guarded_read(
+                "firestore",
+                lambda: [doc.id for doc in firestore_db.collection("users").select([]).stream()],
+                deadline=30.0, hedge_after=None
+            )
+        except Exception as e:
+            print("Failed to seed user filter:", str(e))
+            with self._lock:
+                self._pending = None
+            return
+
+        with self._lock:
+            uids.extend(self._pending or ())
+            self._pending = None
+            self._capacity = int(len(uids) * self.headroom) + 1000
+            self._filter = BloomFilter(self._capacity, self.error_rate)
+            for uid in uids:
+                self._filter.add(uid)
+            self._count = len(uids)
+
+    def _learn(self, uid):
+        # Caller holds the lock
+        if self._pending is not None:
+            self._pending.append(uid)
+        if self._filter is None:
+            return
+        self._filter.add(uid)
+        self._count += 1
+        if self._count > self._capacity:
+            # Past capacity the false-positive rate climbs; reseed at a larger
+            # size while the current filter keeps answering
+            self._schedule_seed()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "ADDED":
+                    self._learn(change.document.id)
+
+    def start(self):
+        """
+        Seed the filter and start listening to the `user_ids` feed (called
+        once at startup). Each process pays one ID-only read of `users` per
+        seed plus one small document read per signup; the listener starts
+        `feed_overlap` seconds in the past so signups racing the seed are not
+        missed. Users created without a `user_ids` entry (e.g. in the console)
+        are only seen after the next seed.
+        """
+        with self._lock:
+            if self._watch is None:
+                since = (datetime.now(UTC) - timedelta(seconds=self.feed_overlap)).isoformat()
+                feed = firestore_db.collection(USER_ID_FEED).where("created_at", ">=", since)
+                self._watch = feed.on_snapshot(self._on_snapshot)
+                self._schedule_seed()
+
+    def add(self, uid):
+        with self._lock:
+            self._learn(uid)
+
+    def might_exist(self, uid):
+        if not uid or not isinstance(uid, str):
+            return False
+        with self._lock:
+            listener_down = self._watch is not None and not self._watch.is_active
+            if listener_down:
+                # Fail open, then resubscribe and reseed to cover the gap
+                self._watch = None
+                self._filter = None
+            else:
+                return self._filter is None or uid in self._filter
+        self.start()
+        return True
+
+
+user_filter = UserExistenceFilter()
+
+
+def user_exists(uid):
+    """True if a users/{uid} document exists; definite misses skip Firestore entirely."""
+    if not user_filter.might_exist(uid):
+        return False
+    return guarded_read("firestore", firestore_db.collection("users").document(uid).get).exists
+
+
+def create_user_document(uid, user_data):
+    """Write users/{uid} and its user_ids feed entry in one batch."""
+    batch = firestore_db.batch()
+    batch.set(firestore_db.collection("users").document(uid), user_data)
+    batch.set(firestore_db.collection(USER_ID_FEED).document(uid), {"created_at": user_data["created_at"]})
+    batch.commit()
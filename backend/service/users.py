@@ -0,0 +1,12 @@
+from service.firebase import firestore_db
+from service.resilience import guarded_read
+
+
+def get_user_profiles(user_ids):
+    """Fetch several users/{uid} documents in one batched read. Returns {uid: data}."""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    refs = [firestore_db.collection("users").document(uid) for uid in user_ids]
+    docs = guarded_read("firestore", lambda: list(firestore_db.get_all(refs)))
+    return {doc.id: doc.to_dict() for doc in docs if doc.exists}
@@ -0,0 +1,116 @@
+import os
+import sys
+import types
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import Recorder, FakeRealtimeDb, FakeFirestore, FakeAuth
+
+os.environ.setdefault("SECRET_KEY", "round-trip-budget-tests-secret-key")
+
+# Stand in for service/firebase.py before any route module imports it
+recorder = Recorder()
+fake_firebase = types.ModuleType("service.firebase")
+fake_firebase.realtime_db = FakeRealtimeDb(recorder)
+fake_firebase.firestore_db = FakeFirestore(recorder)
+fake_firebase.firebase_auth = None
+fake_firebase.DATABASE_URL = "https://default-rtdb.example.com"
+fake_firebase.CHAT_DATABASE_URLS = []
+sys.modules["service.firebase"] = fake_firebase
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+import routes.auth
+import routes.calls
+import routes.friends
+import routes.one_chat
+import routes.random_chat
+import routes.presence
+from routes.auth import auth_bp
+from routes.calls import calls_bp
+from routes.friends import friends_bp
+from routes.friendsList import friends_list_bp
+from routes.one_chat import one_chat_bp
+from routes.random_chat import random_chat_bp
+from routes.profile import profile_bp
+from routes.find_user import find_user_bp
+from routes.presence import presence_bp
+from routes.admin import admin_bp
+from service.call_signaling import CallHub
+from service.chat_shards import chat_db
+from service.friend_graph import FriendGraph
+from service.message_search import MessageSearchIndex
+from service.random_matcher import RandomMatcher
+from service.presence import PresenceTracker
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Fresh fake databases and fresh in-process services for every test."""
+    rtdb = FakeRealtimeDb(recorder)
+    firestore = FakeFirestore(recorder)
+    monkeypatch.setattr(fake_firebase, "realtime_db", rtdb)
+    monkeypatch.setattr(fake_firebase, "firestore_db", firestore)
+    for module in list(sys.modules.values()):
+        name = getattr(module, "__name__", "")
+        if name.startswith(("routes.", "service.")) and name != "service.firebase":
+            if hasattr(module, "realtime_db"):
+                monkeypatch.setattr(module, "realtime_db", rtdb)
+            if hasattr(module, "firestore_db"):
+                monkeypatch.setattr(module, "firestore_db", firestore)
+
+    monkeypatch.setattr(chat_db, "base", rtdb)
+    auth = FakeAuth(recorder)
+    monkeypatch.setattr(routes.auth, "auth", auth)
+    # No SMTP in tests
+    monkeypatch.setattr(routes.auth, "send_verification_email", lambda email, link: None)
+    monkeypatch.setattr(routes.auth, "send_reset_email", lambda email, link: None)
+
+    def reset_services():
+        monkeypatch.setattr(routes.friends, "friend_graph", FriendGraph())
+        monkeypatch.setattr(routes.one_chat, "message_search", MessageSearchIndex())
+        monkeypatch.setattr(routes.random_chat, "random_matcher", RandomMatcher())
+        monkeypatch.setattr(routes.presence, "presence_tracker", PresenceTracker())
+        monkeypatch.setattr(routes.calls, "call_hub", CallHub())
+
+    reset_services()
+    # Keep the write-behind logger from flushing in the background mid-measurement
+    monkeypatch.setattr(routes.random_chat.random_chat_log_writer, "_ensure_running", lambda: None)
+
+    recorder.reset()
+    return types.SimpleNamespace(rtdb=rtdb, firestore=firestore, auth=auth, recorder=recorder,
+                                 reset_services=reset_services)
+
+
+@pytest.fixture
+def app(backend):
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "round-trip-budget-tests-secret-key"
+    app.config["JWT_IDENTITY_CLAIM"] = "uid"
+    app.config["TESTING"] = True
+    JWTManager(app)
+    app.register_blueprint(auth_bp, url_prefix="/auth")
+    app.register_blueprint(profile_bp, url_prefix="/profile")
+    app.register_blueprint(find_user_bp, url_prefix="/find_user")
+    app.register_blueprint(friends_bp, url_prefix="/friends")
+    app.register_blueprint(friends_list_bp, url_prefix="/friends_list")
+    app.register_blueprint(one_chat_bp, url_prefix="/chat")
+    app.register_blueprint(random_chat_bp, url_prefix="/random_chat")
+    app.register_blueprint(presence_bp, url_prefix="/presence")
+    app.register_blueprint(admin_bp, url_prefix="/admin")
+    app.register_blueprint(calls_bp, url_prefix="/calls")
+    return app
+
+
+@pytest.fixture
+def auth_headers(app):
+    def make(uid):
+        with app.app_context():
+            token = create_access_token(identity=uid)
+        return {"Authorization": f"Bearer {token}"}
+    return make
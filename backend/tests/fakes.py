@@ -0,0 +1,411 @@
+"""
+Recording in-memory fakes of the Firestore client and the RTDB module exposed by
+service/firebase.py. Every call that would be a network round trip is logged on
+a shared Recorder with its kind (read/write) and payload size in bytes.
+"""
+import copy
+import itertools
+import json
+import threading
+from types import SimpleNamespace
+
+from firebase_admin import auth as firebase_auth
+
+
+def payload_size(value):
+    return len(json.dumps(value, default=str)) if value is not None else 0
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ops = []
+
+    def record(self, backend, kind, name, value=None):
+        with self._lock:
+            self.ops.append((backend, kind, name, payload_size(value)))
+
+    def reset(self):
+        with self._lock:
+            self.ops = []
+
+    def summary(self):
+        with self._lock:
+            ops = list(self.ops)
+        return {
+            "reads": sum(1 for op in ops if op[1] == "read"),
+            "writes": sum(1 for op in ops if op[1] == "write"),
+            "round_trips": len(ops),
+            "bytes": sum(op[3] for op in ops),
+            "ops": ops,
+        }
+
+
+# --- Realtime Database -------------------------------------------------------
+
+def _split(path):
+    return [part for part in path.strip("/").split("/") if part]
+
+
+class FakeRealtimeDb:
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.tree = {}
+        self._ids = itertools.count()
+
+    def reference(self, path="/"):
+        return FakeReference(self, _split(path))
+
+    # tree helpers (not recorded)
+    def _get(self, parts):
+        node = self.tree
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return copy.deepcopy(node)
+
+    def _set(self, parts, value):
+        if not parts:
+            self.tree = copy.deepcopy(value) if value is not None else {}
+            return
+        node = self.tree
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        if value is None or value == {}:
+            node.pop(parts[-1], None)
+            self._prune(parts[:-1])
+        else:
+            node[parts[-1]] = self._resolve(node.get(parts[-1]), copy.deepcopy(value))
+
+    def _prune(self, parts):
+        # RTDB has no empty nodes: removing the last child removes the parent
+        while parts:
+            parent = self.tree
+            for part in parts[:-1]:
+                parent = parent[part]
+            if parent.get(parts[-1]):
+                return
+            parent.pop(parts[-1], None)
+            parts = parts[:-1]
+
+    @staticmethod
+    def _resolve(current, value):
+        if isinstance(value, dict) and ".sv" in value:
+            return (current or 0) + value[".sv"]["increment"]
+        return value
+
+    def seed(self, path, value):
+        self._set(_split(path), value)
+
+
+class FakeQuery:
+    def __init__(self, ref, order):
+        self.ref = ref
+        self.order = order
+        self.start = None
+        self.end = None
+        self.first = None
+        self.last = None
+
+    def start_at(self, value):
+        self.start = value
+        return self
+
+    def end_at(self, value):
+        self.end = value
+        return self
+
+    def equal_to(self, value):
+        self.start = self.end = value
+        return self
+
+    def limit_to_first(self, n):
+        self.first = n
+        return self
+
+    def limit_to_last(self, n):
+        self.last = n
+        return self
+
+    def get(self):
+        data = self.ref.db._get(self.ref.parts) or {}
+        if self.order == "$key":
+            sort_key = lambda item: item[0]
+        else:
+            sort_key = lambda item: (item[1] or {}).get(self.order, 0)
+        # Children with equal values are ordered by key, as RTDB does
+        items = sorted(data.items(), key=lambda item: (sort_key(item), item[0]))
+        if self.start is not None:
+            items = [item for item in items if sort_key(item) >= self.start]
+        if self.end is not None:
+            items = [item for item in items if sort_key(item) <= self.end]
+        if self.first is not None:
+            items = items[:self.first]
+        if self.last is not None:
+            items = items[-self.last:]
+        result = dict(items)
+        self.ref.db.recorder.record("rtdb", "read", "query:" + self.ref.path, result)
+        return result
+
+
+class FakeReference:
+    def __init__(self, db, parts):
+        self.db = db
+        self.parts = parts
+
+    @property
+    def path(self):
+        return "/" + "/".join(self.parts)
+
+    @property
+    def key(self):
+        return self.parts[-1] if self.parts else None
+
+    def child(self, path):
+        return FakeReference(self.db, self.parts + _split(path))
+
+    def get(self, etag=False, shallow=False):
+        value = self.db._get(self.parts)
+        if shallow and isinstance(value, dict):
+            value = {key: True for key in value}
+        self.db.recorder.record("rtdb", "read", "get:" + self.path, value)
+        return value
+
+    def set(self, value):
+        self.db.recorder.record("rtdb", "write", "set:" + self.path, value)
+        self.db._set(self.parts, value)
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError("Value argument must be a non-empty dictionary.")
+        self.db.recorder.record("rtdb", "write", "update:" + self.path, value)
+        for path, child_value in value.items():
+            self.db._set(self.parts + _split(path), child_value)
+
+    def delete(self):
+        self.db.recorder.record("rtdb", "write", "delete:" + self.path)
+        self.db._set(self.parts, None)
+
+    def push(self, value=""):
+        ref = self.child(f"-push{next(self.db._ids):08d}")
+        ref.set(value)
+        return ref
+
+    def order_by_child(self, path):
+        return FakeQuery(self, path)
+
+    def order_by_key(self):
+        return FakeQuery(self, "$key")
+
+
+# --- Firestore ---------------------------------------------------------------
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def _snapshot(self):
+        return FakeSnapshot(self.id, self.db.docs.get(self.path))
+
+    def get(self, *args, **kwargs):
+        snapshot = self._snapshot()
+        self.db.recorder.record("firestore", "read", "get:" + self.path, snapshot._data)
+        return snapshot
+
+    def set(self, data, merge=False):
+        self.db.recorder.record("firestore", "write", "set:" + self.path, data)
+        self.db.docs[self.path] = copy.deepcopy(data)
+
+    def update(self, data):
+        self.db.recorder.record("firestore", "write", "update:" + self.path, data)
+        self.db.docs.setdefault(self.path, {}).update(copy.deepcopy(data))
+
+    def delete(self):
+        self.db.recorder.record("firestore", "write", "delete:" + self.path)
+        self.db.docs.pop(self.path, None)
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+
+FILTER_OPS = {
+    "==": lambda a, b: a == b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<=": lambda a, b: a is not None and a <= b,
+}
+
+
+class FakeCollection:
+    def __init__(self, db, path, filters=(), order=None, descending=False, limit=None, fields=None):
+        self.db = db
+        self.path = path
+        self.filters = filters
+        self.order = order
+        self.descending = descending
+        self._limit = limit
+        self.fields = fields
+
+    def document(self, doc_id=None):
+        doc_id = doc_id or f"auto{next(self.db._ids):08d}"
+        return FakeDocument(self.db, f"{self.path}/{doc_id}")
+
+    def _derive(self, **changes):
+        params = dict(filters=self.filters, order=self.order, descending=self.descending, limit=self._limit,
+                      fields=self.fields)
+        params.update(changes)
+        return type(self)(self.db, self.path, **params)
+
+    def where(self, field, op, value):
+        assert op in FILTER_OPS, f"filter {op!r} is not faked"
+        return self._derive(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._derive(order=field, descending=direction == "DESCENDING")
+
+    def limit(self, n):
+        return self._derive(limit=n)
+
+    def select(self, fields):
+        return self._derive(fields=list(fields))
+
+    def _matches(self, path):
+        prefix = self.path + "/"
+        return path.startswith(prefix) and "/" not in path[len(prefix):]
+
+    def _run(self):
+        snapshots = [
+            FakeSnapshot(path.rsplit("/", 1)[-1], data)
+            for path, data in self.db.docs.items()
+            if self._matches(path)
+            and all(FILTER_OPS[op](data.get(field), value) for field, op, value in self.filters)
+        ]
+        if self.order:
+            snapshots.sort(key=lambda s: s._data.get(self.order), reverse=self.descending)
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        if self.fields is not None:
+            snapshots = [
+                FakeSnapshot(s.id, {field: s._data[field] for field in self.fields if field in s._data})
+                for s in snapshots
+            ]
+        self.db.recorder.record("firestore", "read", "query:" + self.path, [s._data for s in snapshots])
+        return snapshots
+
+    def get(self):
+        return self._run()
+
+    def stream(self):
+        return iter(self._run())
+
+
+class FakeCollectionGroup(FakeCollection):
+    """Every collection named `path`, at any depth."""
+
+    def _matches(self, path):
+        parts = path.split("/")
+        return len(parts) >= 2 and parts[-2] == self.path
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        self.db.recorder.record("firestore", "write", "batch", [data for _, data in self.writes])
+        for ref, data in self.writes:
+            self.db.docs[ref.path] = copy.deepcopy(data)
+
+
+class FakeFirestore:
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.docs = {}
+        self._ids = itertools.count()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def collection_group(self, name):
+        return FakeCollectionGroup(self, name)
+
+    def get_all(self, refs, *args, **kwargs):
+        snapshots = [ref._snapshot() for ref in refs]
+        self.recorder.record("firestore", "read", "get_all", [s._data for s in snapshots])
+        return iter(snapshots)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def seed(self, path, data):
+        self.docs[path] = copy.deepcopy(data)
+
+
+# --- Firebase Auth -------------------------------------------------------------
+
+class FakeAuth:
+    """
+    Stand-in for the firebase_admin.auth module. User lookups and generated
+    links are Auth API round trips; ID tokens are verified locally, as the SDK
+    does with its cached public keys.
+    """
+
+    UserNotFoundError = firebase_auth.UserNotFoundError
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.users = {}       # uid -> user record
+        self.id_tokens = {}   # token -> decoded claims
+        self._ids = itertools.count()
+
+    def add_user(self, uid, email, display_name="", email_verified=True):
+        self.users[uid] = SimpleNamespace(uid=uid, email=email, display_name=display_name,
+                                          email_verified=email_verified)
+        return self.users[uid]
+
+    def _lookup(self, name, match):
+        user = next((u for u in self.users.values() if match(u)), None)
+        self.recorder.record("auth", "read", name, vars(user) if user else None)
+        if user is None:
+            raise self.UserNotFoundError("No user record found")
+        return user
+
+    def create_user(self, email, password, display_name=None):
+        self.recorder.record("auth", "write", "create_user", {"email": email, "display_name": display_name})
+        return self.add_user(f"auth{next(self._ids):024d}", email, display_name or "", email_verified=False)
+
+    def get_user(self, uid):
+        return self._lookup("get_user", lambda u: u.uid == uid)
+
+    def get_user_by_email(self, email):
+        return self._lookup("get_user_by_email", lambda u: u.email == email)
+
+    def verify_id_token(self, id_token):
+        return dict(self.id_tokens[id_token])
+
+    def generate_email_verification_link(self, email):
+        self.recorder.record("auth", "write", "email_verification_link", email)
+        return f"https://example.com/verify?email={email}"
+
+    def generate_password_reset_link(self, email):
+        self.recorder.record("auth", "write", "password_reset_link", email)
+        return f"https://example.com/reset?email={email}"
@@ -0,0 +1,45 @@
+import threading
+from collections import Counter
+
+import service.random_matcher
+from service.analytics import ActivityAnalytics
+from service.random_matcher import RandomMatcher
+
+
+def recorded_counts(analytics):
+    counts = Counter()
+    for stripe in analytics._stripes:
+        counts.update({key[2]: n for key, n in stripe.counts.items() if key[0] == "day"})
+    return counts
+
+
+def test_threads_record_on_different_stripes():
+    analytics = ActivityAnalytics(stripes=16)
+    used = []
+    barrier = threading.Barrier(2)
+
+    def record():
+        barrier.wait()   # both threads alive at once, so their idents differ
+        analytics.record("messages", "someone")
+        used.append(analytics._stripe())
+
+    threads = [threading.Thread(target=record) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert used[0] is not used[1]
+    assert recorded_counts(analytics)["messages"] == 2
+
+
+def test_random_session_is_counted_once_per_pairing(monkeypatch):
+    analytics = ActivityAnalytics()
+    monkeypatch.setattr(service.random_matcher, "analytics", analytics)
+    matcher = RandomMatcher()
+
+    assert matcher.join("alice", use_interests=False) is None
+    assert matcher.join("bob", use_interests=False) == "alice"
+    assert matcher.poll("alice")[1] == "bob"
+
+    assert recorded_counts(analytics)["random_sessions"] == 1
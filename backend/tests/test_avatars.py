@@ -0,0 +1,54 @@
+import io
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from service import avatars
+from service.avatars import ImageProcessingError, public_url, store_avatar
+
+
+class FailingPool:
+    def __init__(self, error):
+        self.error = error
+        self.shut_down = False
+
+    def submit(self, fn, data):
+        future = Future()
+        future.set_exception(self.error)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.mark.parametrize("error", [TimeoutError(), BrokenProcessPool()])
+def test_slow_or_crashed_render_is_not_a_bad_image_and_resets_the_pool(tmp_path, monkeypatch, error):
+    monkeypatch.setattr(avatars, "AVATAR_DIR", str(tmp_path))
+    pool = FailingPool(error)
+    monkeypatch.setattr(avatars, "_pool", pool)
+
+    with pytest.raises(ImageProcessingError):
+        store_avatar(b"not really an image")
+    assert pool.shut_down and avatars._pool is None
+
+
+def test_stored_paths_are_made_absolute_only_when_served(monkeypatch):
+    monkeypatch.setattr(avatars, "MEDIA_BASE_URL", "https://cdn.example.com")
+    assert public_url("/profile/images/ab_96.webp") == "https://cdn.example.com/profile/images/ab_96.webp"
+    assert public_url("https://elsewhere.example.com/pic.png") == "https://elsewhere.example.com/pic.png"
+    assert public_url(None) == ""
+
+
+def test_render_pool_spawns_workers_instead_of_forking(monkeypatch):
+    Image = pytest.importorskip("PIL.Image")
+    monkeypatch.setattr(avatars, "_pool", None)
+    pool = avatars._get_pool()
+    try:
+        assert pool._mp_context.get_start_method() == "spawn"
+        image = io.BytesIO()
+        Image.new("RGB", (40, 30), "red").save(image, format="PNG")
+        variants = pool.submit(avatars.render_thumbnails, image.getvalue()).result(timeout=60)
+        assert sorted(variants) == sorted(avatars.THUMBNAIL_SIZES)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from service.call_signaling import CallHub, CallError
+
+
+def drain(conn):
+    events = []
+    while not conn.events.empty():
+        events.append(conn.events.get_nowait())
+    return events
+
+
+def wait_for_history(hub):
+    hub._history_writer.submit(lambda: None).result(timeout=5)
+
+
+def test_signals_are_relayed_and_history_written_once(backend):
+    hub = CallHub()
+    alice, bob = hub.connect("alice"), hub.connect("bob")
+    backend.firestore.seed("users/alice", {"username": "alice"})
+    backend.firestore.seed("users/bob", {"username": "bob"})
+
+    call_id = hub.start_call("alice", "bob", {"sdp": "offer"})
+    assert drain(bob) == [{"type": "incoming_call", "call_id": call_id, "from": "alice", "offer": {"sdp": "offer"}}]
+    with pytest.raises(CallError) as busy:
+        hub.start_call("carol", "bob", {"sdp": "offer"})
+    assert busy.value.status == 409
+
+    hub.answer("bob", call_id, {"sdp": "answer"})
+    hub.relay_candidate("bob", call_id, {"candidate": "c1"})
+    assert [e["type"] for e in drain(alice)] == ["call_answered", "ice_candidate"]
+
+    backend.recorder.reset()
+    hub.end("alice", call_id)
+    with pytest.raises(CallError):
+        hub.end("bob", call_id)
+    wait_for_history(hub)
+
+    assert drain(bob) == [{"type": "call_ended", "call_id": call_id, "reason": "completed"}]
+    writes = [op for op in backend.recorder.summary()["ops"] if op[1] == "write"]
+    assert len(writes) == 1
+    assert backend.firestore.docs[f"call_history/alice/calls/{call_id}"]["direction"] == "outgoing"
+    assert backend.firestore.docs[f"call_history/bob/calls/{call_id}"]["other_username"] == "alice"
+
+
+def test_unanswered_call_times_out_as_missed(backend):
+    hub = CallHub(ring_timeout=0.05)
+    alice, bob = hub.connect("alice"), hub.connect("bob")
+
+    call_id = hub.start_call("alice", "bob", {"sdp": "offer"})
+    deadline = time.time() + 2
+    while call_id in hub._calls and time.time() < deadline:
+        time.sleep(0.01)
+    wait_for_history(hub)
+
+    assert call_id not in hub._calls
+    assert drain(alice) == [{"type": "call_ended", "call_id": call_id, "reason": "missed"}]
+    assert backend.firestore.docs[f"call_history/bob/calls/{call_id}"]["status"] == "missed"
+    with pytest.raises(CallError):
+        hub.answer("bob", call_id, {"sdp": "answer"})
@@ -0,0 +1,96 @@
+from fakes import FakeRealtimeDb
+from service import chat_shards
+from service.chat_shards import HashRing, ShardedRealtimeDb
+
+URLS = [f"https://shard-{i}.example.com" for i in range(3)]
+
+
+class RecordingBase:
+    """Minimal stand-in for the RTDB module that remembers which instance each call hit."""
+
+    def __init__(self):
+        self.updates = []
+
+    def reference(self, path, url=None):
+        base = self
+
+        class Ref:
+            def update(self, value):
+                base.updates.append((url, path, value))
+
+        return Ref()
+
+
+def test_adding_an_instance_moves_only_its_share_of_chats():
+    chat_ids = [f"chat_{i}" for i in range(3000)]
+    before = HashRing(URLS)
+    after = HashRing(URLS + ["https://shard-3.example.com"])
+
+    moved = [c for c in chat_ids if before.node_for(c) != after.node_for(c)]
+    assert all(after.node_for(c) == "https://shard-3.example.com" for c in moved)
+    assert 0.15 < len(moved) / len(chat_ids) < 0.35
+
+
+def test_multi_path_update_is_split_per_instance():
+    base = RecordingBase()
+    sharded = ShardedRealtimeDb(base, "https://default.example.com", URLS)
+    chat_id = "chat_a_b"
+
+    sharded.reference("/").update({
+        f"chats/{chat_id}/last_message": {"message": "hi"},
+        f"inbox/a/{chat_id}/updated_at": 1,
+    })
+
+    assert base.updates == [
+        (sharded.shard_url(chat_id), "/", {f"chats/{chat_id}/last_message": {"message": "hi"}}),
+        (None, "/", {f"inbox/a/{chat_id}/updated_at": 1}),
+    ]
+
+
+class MultiUrlDb:
+    """One recording fake per database URL behind the RTDB module's reference(path, url=...)."""
+
+    def __init__(self, recorder, urls):
+        self.instances = {url: FakeRealtimeDb(recorder) for url in urls}
+
+    def reference(self, path="/", url=None):
+        return self.instances[url].reference(path)
+
+
+def test_rebalance_merges_into_target_and_keeps_writes_made_mid_move(backend, monkeypatch):
+    urls = URLS + ["https://shard-3.example.com"]
+    db = MultiUrlDb(backend.recorder, urls)
+    monkeypatch.setattr(chat_shards, "realtime_db", db)
+    chat_id = next(c for c in (f"chat_{i}" for i in range(1000))
+                   if HashRing(URLS).node_for(c) != HashRing(urls).node_for(c))
+    source, target = HashRing(URLS).node_for(chat_id), HashRing(urls).node_for(chat_id)
+
+    db.instances[source].seed(f"chats/{chat_id}", {
+        "users": ["a", "b"],
+        "messages": {"m1": {"message": "old", "timestamp": 1}},
+        "last_message": {"message": "old", "timestamp": 1},
+    })
+    # Already written through the new ring before the move
+    db.instances[target].seed(f"chats/{chat_id}/messages/m2", {"message": "new", "timestamp": 2})
+    db.instances[target].seed(f"chats/{chat_id}/last_message", {"message": "new", "timestamp": 2})
+
+    copy_chat = chat_shards._copy_chat
+
+    def copy_then_race(*args):
+        copied = copy_chat(*args)
+        db.instances[source].seed(f"chats/{chat_id}/messages/m3", {"message": "late", "timestamp": 3})
+        return copied
+
+    monkeypatch.setattr(chat_shards, "_copy_chat", copy_then_race)
+    moves = chat_shards.rebalance(URLS, urls, dry_run=False)
+
+    assert (chat_id, source, target, 1) in moves
+    on_target = db.instances[target]._get(["chats", chat_id])
+    assert set(on_target["messages"]) == {"m1", "m2"}
+    assert on_target["last_message"]["message"] == "new"
+    assert set(db.instances[source]._get(["chats", chat_id, "messages"])) == {"m3"}
+
+    monkeypatch.setattr(chat_shards, "_copy_chat", copy_chat)
+    chat_shards.rebalance(URLS, urls, dry_run=False)
+    assert db.instances[source]._get(["chats", chat_id]) is None
+    assert set(db.instances[target]._get(["chats", chat_id, "messages"])) == {"m1", "m2", "m3"}
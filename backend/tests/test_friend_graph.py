@@ -0,0 +1,75 @@
+import service.friend_graph
+from service.friend_graph import FriendGraph
+
+ME, A, B, C, D = "me", "a", "b", "c", "d"
+
+
+def befriend(backend, x, y):
+    backend.rtdb.seed(f"friends/{x}/{y}", {"status": "accepted"})
+    backend.rtdb.seed(f"friends/{y}/{x}", {"status": "accepted"})
+
+
+def wait_for_reload(graph):
+    graph._loader.submit(lambda: None).result(timeout=5)
+
+
+def test_ranks_by_mutual_friends_and_excludes_self_and_friends(backend):
+    for friend in (A, B):
+        befriend(backend, ME, friend)
+    befriend(backend, A, B)
+    for friend in (A, B):
+        befriend(backend, friend, C)
+    befriend(backend, A, D)
+    backend.rtdb.seed(f"friends/{B}/e", {"status": "pending"})
+
+    graph = FriendGraph()
+    assert graph.suggestions(ME) == [(C, 2), (D, 1)]
+    assert graph.suggestions(ME, limit=1) == [(C, 2)]
+    assert graph.suggestions("unknown") == []
+
+
+def test_friendships_made_elsewhere_are_picked_up_after_max_age(backend, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(service.friend_graph.time, "monotonic", lambda: clock[0])
+    befriend(backend, ME, A)
+    befriend(backend, A, C)
+    graph = FriendGraph(max_age=60)
+    assert graph.suggestions(ME) == [(C, 1)]
+
+    # Accepted through another worker: this process's hook never ran
+    befriend(backend, ME, C)
+    assert graph.suggestions(ME) == [(C, 1)]
+
+    clock[0] += 61
+    backend.recorder.reset()
+    assert graph.suggestions(ME) == [(C, 1)]   # the stale graph answers while the reload runs
+    wait_for_reload(graph)
+    assert graph.suggestions(ME) == []
+    assert backend.recorder.summary()["reads"] == 1
+
+
+def test_friendship_accepted_during_a_reload_is_kept(backend, monkeypatch):
+    befriend(backend, ME, A)
+    graph = FriendGraph()
+    graph.suggestions(ME)
+
+    real_load = graph._load
+
+    def load_with_concurrent_accept():
+        graph.add_friendship(A, B)
+        return real_load()
+
+    graph._built_at -= graph.max_age
+    monkeypatch.setattr(graph, "_load", load_with_concurrent_accept)
+    graph.suggestions(ME)
+    wait_for_reload(graph)
+    assert graph.suggestions(ME) == [(B, 1)]
+
+
+def test_negative_suggestion_limit_is_clamped(app, backend, auth_headers):
+    befriend(backend, ME, A)
+    befriend(backend, A, C)
+    backend.firestore.seed(f"users/{C}", {"username": "c"})
+
+    response = app.test_client().get("/friends/suggestions", query_string={"limit": -1}, headers=auth_headers(ME))
+    assert [s["user_id"] for s in response.get_json()["suggestions"]] == [C]
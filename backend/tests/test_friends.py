@@ -0,0 +1,8 @@
+from routes.friends import split_bulk_sender_ids
+
+
+def test_bulk_split_reports_non_string_ids_instead_of_failing():
+    requests_data = {"alice": {"status": "pending"}}
+    found, not_found = split_bulk_sender_ids("bob", ["alice", ["x"], {"y": 1}, "alice", "carol"], requests_data)
+    assert found == ["alice"]
+    assert not_found == [["x"], {"y": 1}, "carol"]
@@ -0,0 +1,44 @@
+import time
+
+import service.message_search
+from service.message_search import MessageSearchIndex, UserMessageIndex
+
+A, B = "user" + "1" * 24, "user" + "2" * 24
+CHAT = f"chat_{A}_{B}"
+
+
+def wait_for_rebuild(search, uid):
+    deadline = time.time() + 5
+    while uid in search._loading and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_prefix_matches_only_terms_sharing_the_prefix():
+    index = UserMessageIndex()
+    index.add("c", "m1", A, "hello help", 1)
+    index.add("c", "m2", A, "helium hero", 2)
+    assert index._terms_for("hel", is_prefix=True) == ["helium", "hello", "help"]
+    assert [doc[1] for doc, _ in index.search("hell")] == ["m1"]
+
+
+def test_indexes_are_evicted_and_rebuilt_when_stale(backend, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(service.message_search.time, "monotonic", lambda: clock[0])
+    backend.rtdb.seed(f"friends/{A}/{B}", {"status": "accepted"})
+    backend.rtdb.seed(f"friends/{B}/{A}", {"status": "accepted"})
+    backend.rtdb.seed(f"chats/{CHAT}/messages/m1", {"sender": A, "message": "first note", "timestamp": 1})
+    search = MessageSearchIndex(max_users=1, max_age=60)
+
+    assert search.search(A, "note")[1] == 1
+    # Written by another worker: the send hook in this process never sees it
+    backend.rtdb.seed(f"chats/{CHAT}/messages/m2", {"sender": B, "message": "second note", "timestamp": 2})
+    assert search.search(A, "note")[1] == 1
+    clock[0] += 61
+    backend.recorder.reset()
+    assert search.search(A, "note")[1] == 1   # answered from the stale index; rebuilt in the background
+    wait_for_rebuild(search, A)
+    assert backend.recorder.summary()["reads"] > 0
+    assert search.search(A, "note")[1] == 2
+
+    search.search(B, "note")
+    assert list(search._indexes) == [B]
@@ -0,0 +1,87 @@
+import service.presence
+from service.presence import PresenceTracker
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_user_expires_one_ttl_after_last_heartbeat(monkeypatch):
+    clock = FakeClock(1000.3)
+    monkeypatch.setattr(service.presence.time, "monotonic", clock)
+    tracker = PresenceTracker(ttl=30, tick=1.0)
+    tracker._thread = object()  # drive _expire by hand instead of the background thread
+
+    tracker.heartbeat("alice")
+    went_offline_at = None
+    while clock.now < 1100 and went_offline_at is None:
+        clock.now = round(clock.now + 0.1, 1)
+        tracker._expire(clock.now)
+        if not tracker.lookup(["alice"])["alice"]["online"]:
+            went_offline_at = clock.now
+
+    assert 1030.3 <= went_offline_at <= 1031.3 + tracker.tick
+    assert tracker._transitions["alice"] == "offline"
+
+
+def test_refreshed_heartbeat_moves_expiry_forward(monkeypatch):
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr(service.presence.time, "monotonic", clock)
+    tracker = PresenceTracker(ttl=30, tick=1.0)
+    tracker._thread = object()
+
+    tracker.heartbeat("alice")
+    clock.now = 1020.0
+    tracker.heartbeat("alice")
+    for now in (1031.0, 1049.5):
+        tracker._expire(now)
+        assert tracker.lookup(["alice"])["alice"]["online"]
+    tracker._expire(1050.5)
+    assert not tracker.lookup(["alice"])["alice"]["online"]
+
+
+def test_lookup_falls_back_to_presence_flushed_by_other_workers(backend):
+    here, elsewhere = PresenceTracker(), PresenceTracker()
+    here._thread = elsewhere._thread = object()
+    here.heartbeat("alice")
+    elsewhere.heartbeat("bob")
+    elsewhere.heartbeat("carol")
+    elsewhere.flush()
+    elsewhere.go_offline("carol")
+    elsewhere.flush()
+
+    backend.recorder.reset()
+    result = here.lookup(["alice", "bob", "carol", "dave"])
+    assert {uid: state["online"] for uid, state in result.items()} == {
+        "alice": True, "bob": True, "carol": False, "dave": False
+    }
+    assert result["bob"]["last_seen"] is not None
+    assert backend.recorder.summary()["reads"] == 1
+
+    backend.recorder.reset()
+    here.lookup(["alice"])
+    assert backend.recorder.summary()["reads"] == 0
+
+
+def test_last_seen_is_forgotten_after_retention_once_flushed_offline(backend, monkeypatch):
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr(service.presence.time, "monotonic", clock)
+    tracker = PresenceTracker(last_seen_retention=600)
+    tracker._thread = object()
+
+    tracker.heartbeat("alice")
+    tracker.heartbeat("bob")
+    tracker.go_offline("alice")
+    tracker.flush()
+
+    clock.now += 599
+    tracker._forget(clock.now)
+    assert "alice" in tracker._last_seen
+    clock.now += 1
+    tracker._forget(clock.now)
+    assert "alice" not in tracker._last_seen
+    assert "bob" in tracker._last_seen
@@ -0,0 +1,73 @@
+import routes.random_chat
+from service.random_chat_log import RandomChatLogWriter
+
+ME = "user" + "0" * 24
+VICTIM = "user" + "9" * 24
+
+
+def post_log(app, auth_headers, body):
+    return app.test_client().post("/random_chat/log", json=body, headers=auth_headers(ME))
+
+
+def test_unpaired_session_is_only_written_to_callers_history(app, backend, auth_headers, monkeypatch):
+    writer = RandomChatLogWriter()
+    monkeypatch.setattr(routes.random_chat, "random_chat_log_writer", writer)
+    monkeypatch.setattr(writer, "_ensure_running", lambda: None)
+    backend.firestore.seed(f"users/{VICTIM}", {"username": "victim"})
+
+    response = post_log(app, auth_headers, {"other_user_id": VICTIM, "other_username": "v", "session_id": "abc"})
+    assert response.status_code == 202
+    writer.flush()
+
+    assert f"random_chat_history/{ME}/sessions/abc" in backend.firestore.docs
+    assert not any(path.startswith(f"random_chat_history/{VICTIM}/") for path in backend.firestore.docs)
+
+
+def test_paired_session_is_mirrored_under_the_server_session_id(app, backend, auth_headers, monkeypatch):
+    writer = RandomChatLogWriter()
+    monkeypatch.setattr(routes.random_chat, "random_chat_log_writer", writer)
+    monkeypatch.setattr(writer, "_ensure_running", lambda: None)
+    backend.firestore.seed(f"users/{VICTIM}", {"username": "victim"})
+    routes.random_chat.random_matcher.join(VICTIM, use_interests=False)
+    routes.random_chat.random_matcher.join(ME, use_interests=False)
+    session_id = routes.random_chat.random_matcher.session_for(ME, VICTIM)
+
+    response = post_log(app, auth_headers, {"other_user_id": VICTIM, "other_username": "v", "session_id": "abc"})
+    assert response.status_code == 202
+    writer.flush()
+
+    assert f"random_chat_history/{VICTIM}/sessions/{session_id}" in backend.firestore.docs
+    assert f"random_chat_history/{VICTIM}/sessions/abc" not in backend.firestore.docs
+
+
+def test_unknown_other_user_is_rejected(app, backend, auth_headers):
+    response = post_log(app, auth_headers, {"other_user_id": VICTIM, "other_username": "v"})
+    assert response.status_code == 404
+
+
+def test_failed_batches_are_retried_a_bounded_number_of_times(backend, monkeypatch):
+    writer = RandomChatLogWriter(max_attempts=3, retry_delay=0)
+    monkeypatch.setattr(writer, "_ensure_running", lambda: None)
+    commits = []
+
+    class FlakyBatch:
+        failures = 1
+
+        def set(self, ref, data, merge=False):
+            pass
+
+        def commit(self):
+            commits.append(1)
+            if len(commits) <= FlakyBatch.failures:
+                raise RuntimeError("unavailable")
+
+    monkeypatch.setattr(backend.firestore, "batch", FlakyBatch)
+    writer.enqueue(ME, VICTIM, {}, "t")
+    writer.flush()
+    assert len(commits) == 2 and writer._queue.empty()
+
+    commits.clear()
+    FlakyBatch.failures = 10
+    writer.enqueue(ME, VICTIM, {}, "t")
+    writer.flush()
+    assert len(commits) == 3 and writer._queue.empty()
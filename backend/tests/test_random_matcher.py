@@ -0,0 +1,24 @@
+import service.random_matcher
+from service.random_matcher import RandomMatcher
+
+
+def test_waiters_that_stop_polling_are_not_matched(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(service.random_matcher.time, "monotonic", lambda: clock[0])
+    matcher = RandomMatcher(poll_ttl=15.0)
+
+    assert matcher.join("gone", use_interests=False) is None
+    assert matcher.join("active", use_interests=False) == "gone"   # paired, but "gone" never polls
+    assert matcher.join("waiting", use_interests=False) is None
+
+    clock[0] += 10
+    assert matcher.poll("waiting") == ("waiting", None)
+    clock[0] += 10
+    # "waiting" polled 10s ago and is still eligible; the uncollected match for "gone" has expired
+    assert matcher.join("newcomer", use_interests=False) == "waiting"
+    assert "gone" not in matcher._matches
+
+    assert matcher.join("closed_tab", use_interests=False) is None
+    clock[0] += 16
+    assert matcher.join("late", use_interests=False) is None
+    assert matcher._uids == ["late"]
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from service import resilience
+from service.resilience import (
+    CircuitBreaker, DependencyUnavailable, WriteOutcomeUnknown, guarded_call, guarded_read, guarded_write
+)
+
+
+@pytest.fixture
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(resilience, "breakers", {
+        "firestore": CircuitBreaker("firestore"),
+        "rtdb": CircuitBreaker("rtdb"),
+    })
+    return resilience.breakers
+
+
+def test_slow_firestore_does_not_starve_rtdb(fresh_breakers):
+    release = threading.Event()
+    pool_size = resilience._executors["firestore"]._max_workers
+    blockers = [resilience._executors["firestore"].submit(release.wait) for _ in range(pool_size)]
+    try:
+        assert guarded_read("rtdb", lambda: "ok", deadline=1.0) == "ok"
+        assert fresh_breakers["rtdb"].snapshot()["state"] == "closed"
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result()
+
+
+def test_write_past_deadline_reports_unknown_outcome(fresh_breakers):
+    with pytest.raises(WriteOutcomeUnknown):
+        guarded_write("rtdb", lambda: time.sleep(0.3), deadline=0.05)
+
+
+class Flaky:
+    """Callable that raises the queued errors in order, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_breaker_opens_after_threshold_and_fails_fast(fresh_breakers):
+    breaker = fresh_breakers["rtdb"] = CircuitBreaker("rtdb", failure_threshold=3, reset_timeout=60)
+    failing = Flaky(*[ConnectionError("down")] * 10)
+
+    for _ in range(3):
+        with pytest.raises(DependencyUnavailable):
+            guarded_call("rtdb", failing, deadline=1.0)
+    assert breaker.snapshot()["state"] == "open"
+
+    with pytest.raises(DependencyUnavailable, match="circuit is open"):
+        guarded_call("rtdb", failing, deadline=1.0)
+    assert failing.calls == 3
+    assert breaker.snapshot()["rejected"] == 1
+
+
+@pytest.mark.parametrize("trial_succeeds, final_state", [(True, "closed"), (False, "open")])
+def test_half_open_allows_one_trial_that_decides_the_state(fresh_breakers, trial_succeeds, final_state):
+    breaker = fresh_breakers["rtdb"] = CircuitBreaker("rtdb", failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(DependencyUnavailable):
+        guarded_call("rtdb", Flaky(ConnectionError("down")), deadline=1.0)
+    assert breaker.snapshot()["state"] == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.snapshot()["state"] == "half_open"
+    assert not breaker.allow()  # only one trial while half-open
+
+    if trial_succeeds:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+    assert breaker.snapshot()["state"] == final_state
+    assert breaker.allow() == trial_succeeds
+
+
+def test_transient_errors_are_retried_with_jittered_backoff(fresh_breakers, monkeypatch):
+    bounds = []
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: bounds.append((low, high)) or 0.0)
+    flaky = Flaky(ConnectionError("blip"), TimeoutError("slow"))
+
+    assert guarded_call("rtdb", flaky, deadline=1.0, retries=2) == "ok"
+    assert flaky.calls == 3
+    assert bounds == [(0, 0.05), (0, 0.1)]
+    assert fresh_breakers["rtdb"].snapshot()["retries"] == 2
+
+    exhausted = Flaky(*[ConnectionError("down")] * 5)
+    with pytest.raises(DependencyUnavailable):
+        guarded_call("rtdb", exhausted, deadline=1.0, retries=2)
+    assert exhausted.calls == 3
+
+
+def test_non_transient_errors_are_not_retried(fresh_breakers):
+    bad_request = Flaky(ValueError("bad path"))
+    with pytest.raises(ValueError):
+        guarded_call("rtdb", bad_request, deadline=1.0, retries=2)
+    assert bad_request.calls == 1
+    snapshot = fresh_breakers["rtdb"].snapshot()
+    assert snapshot["state"] == "closed" and snapshot["failures"] == 0
+
+
+def test_hedged_duplicate_fires_after_hedge_after(fresh_breakers):
+    release = threading.Event()
+    started = []
+
+    def first_call_stalls():
+        started.append(time.monotonic())
+        if len(started) == 1:
+            release.wait(2)
+            return "slow"
+        return "fast"
+
+    try:
+        assert guarded_read("rtdb", first_call_stalls, deadline=1.0, hedge_after=0.05) == "fast"
+    finally:
+        release.set()
+    assert len(started) == 2
+    assert started[1] - started[0] >= 0.05
+    assert fresh_breakers["rtdb"].snapshot()["hedges"] == 1
+
+
+def test_no_hedge_when_the_first_call_answers_in_time(fresh_breakers):
+    calls = Flaky()
+    assert guarded_read("rtdb", calls, deadline=1.0, hedge_after=0.5) == "ok"
+    assert calls.calls == 1
+    assert fresh_breakers["rtdb"].snapshot()["hedges"] == 0
@@ -0,0 +1,372 @@
+"""
+Round-trip budgets per route.
+
+Each route runs against the recording fakes at a small and a large data size.
+A route fails if its number of Firebase round trips changes with data size
+(an N+1 pattern) or exceeds the budget declared below, or, for routes whose
+payload should not depend on how much data the user has, if the bytes read
+and written grow.
+"""
+import pytest
+
+import routes.admin
+import routes.calls
+import routes.one_chat
+from service.analytics import HyperLogLog
+
+SMALL, LARGE = 3, 30
+
+
+def uid(i):
+    """28-character alphanumeric IDs, the shape Firebase Auth produces."""
+    return f"user{i:024d}"
+
+
+ME = uid(0)
+STRANGER = uid(9999)
+
+
+def chat_id_for(a, b):
+    return f"chat_{min(a, b)}_{max(a, b)}"
+
+
+def seed(backend, n):
+    """A user with n friends, n pending requests and n chats of n messages each."""
+    rtdb, firestore = backend.rtdb, backend.firestore
+    everyone = [ME, STRANGER] + [uid(i) for i in range(1, 4 * n + 1)]
+    for user in everyone:
+        firestore.seed(f"users/{user}", {
+            "uid": user,
+            "username": f"name{user[-4:]}",
+            "display_name": f"Name {user[-4:]}",
+            "profilePic": "",
+            "whoami": "music games travel",
+        })
+
+    friends = [uid(i) for i in range(1, n + 1)]
+    senders = [uid(i) for i in range(n + 1, 2 * n + 1)]
+    friends_of_friends = [uid(i) for i in range(2 * n + 1, 3 * n + 1)]
+
+    for i, friend in enumerate(friends):
+        rtdb.seed(f"friends/{ME}/{friend}", {"status": "accepted", "timestamp": "t"})
+        rtdb.seed(f"friends/{friend}/{ME}", {"status": "accepted", "timestamp": "t"})
+        rtdb.seed(f"friends/{friend}/{friends_of_friends[i]}", {"status": "accepted", "timestamp": "t"})
+        rtdb.seed(f"friends/{friends_of_friends[i]}/{friend}", {"status": "accepted", "timestamp": "t"})
+
+        chat_id = chat_id_for(ME, friend)
+        messages = {
+            f"m{j:06d}": {"sender": ME if j % 2 else friend, "message": f"hello number {j}", "timestamp": j}
+            for j in range(n)
+        }
+        last_id = f"m{n - 1:06d}"
+        last_message = dict(messages[last_id], message_id=last_id)
+        rtdb.seed(f"chats/{chat_id}", {"users": [ME, friend], "messages": messages, "last_message": last_message})
+        for user, other in ((ME, friend), (friend, ME)):
+            rtdb.seed(f"inbox/{user}/{chat_id}", {
+                "chat_id": chat_id,
+                "other_user_id": other,
+                "last_message": last_message,
+                "updated_at": last_message["timestamp"] + i,
+                "unread_count": 1,
+            })
+
+    for sender in senders:
+        rtdb.seed(f"friend_requests/{ME}/{sender}", {"status": "pending", "timestamp": "t"})
+
+    # n client_ids sent today and yesterday, as ChatBox sends one with every message
+    for day in routes.one_chat.client_id_days():
+        rtdb.seed(f"client_ids/{ME}/{day}", {f"sent-{j}": f"m{j:06d}" for j in range(n)})
+
+    backend.auth.add_user(ME, f"{ME}@example.com", "Me")
+    backend.auth.id_tokens["google-me"] = {"uid": ME, "email": f"{ME}@example.com", "name": "Me"}
+    backend.auth.id_tokens["google-new"] = {"uid": uid(9998), "email": "new@example.com", "name": "New Person"}
+    for i in range(n):
+        firestore.seed(f"call_history/{ME}/calls/c{i:04d}", {"other_user_id": STRANGER, "started_at": f"t{i:04d}"})
+
+    firestore.seed(f"random_chat_history/{ME}/sessions/s1", {"other_user_id": STRANGER, "ended_at": "t"})
+
+    for day in range(1, n + 1):
+        bucket = f"2026-01-{day:02d}"
+        firestore.seed(f"analytics_buckets/day_{bucket}", {
+            "granularity": "day", "bucket": bucket, "counts": {"messages": day}
+        })
+        sketch = HyperLogLog()
+        sketch.add(ME)
+        firestore.seed(f"analytics_buckets/day_{bucket}/sketches/worker-1", {
+            "granularity": "day", "bucket": bucket, "registers": bytes(sketch.registers)
+        })
+    return {"friends": friends, "senders": senders, "n": n}
+
+
+def first_chat(data):
+    return chat_id_for(ME, data["friends"][0])
+
+
+def call_stranger():
+    routes.calls.call_hub.connect(STRANGER)
+    return {"callee_id": STRANGER, "offer": {"sdp": "offer"}}
+
+
+def ring_me():
+    """A call from STRANGER ringing ME on the in-process hub; returns its call_id."""
+    hub = routes.calls.call_hub
+    hub.connect(ME)
+    hub.connect(STRANGER)
+    return hub.start_call(STRANGER, ME, {"sdp": "offer"})
+
+
+def answered_call():
+    call_id = ring_me()
+    routes.calls.call_hub.answer(ME, call_id, {"sdp": "answer"})
+    return call_id
+
+
+def warm_search(data):
+    """Searches after the user's index has been built are served from memory."""
+    routes.one_chat.message_search.search(ME, "hello")
+    return {"q": "hello numb"}
+
+
+# name -> (method, path, body builder or None, round-trip budget)
+# /calls/events is left out: it is an endless event stream that never touches Firebase.
+ROUTES = {
+    "signup": ("POST", "/auth/signup",
+               lambda d: {"email": "new@example.com", "password": "password123", "display_name": "New Person"}, 4),
+    "verify_email": ("POST", "/auth/verify-email", lambda d: {"uid": ME}, 2),
+    "login": ("POST", "/auth/login", lambda d: {"email": f"{ME}@example.com", "password": "password123"}, 2),
+    "reset_password": ("POST", "/auth/reset-password", lambda d: {"email": f"{ME}@example.com"}, 1),
+    "google_signup": ("POST", "/auth/google-signup", lambda d: {"idToken": "google-new"}, 3),
+    "google_login": ("POST", "/auth/google-login", lambda d: {"idToken": "google-me"}, 1),
+    "start_call": ("POST", "/calls/start", lambda d: call_stranger(), 0),
+    "answer_call": ("POST", "/calls/answer", lambda d: {"call_id": ring_me(), "answer": {"sdp": "answer"}}, 0),
+    "relay_candidate": ("POST", "/calls/candidate",
+                        lambda d: {"call_id": answered_call(), "candidate": {"candidate": "c1"}}, 0),
+    "reject_call": ("POST", "/calls/reject", lambda d: {"call_id": ring_me()}, 2),
+    "end_call": ("POST", "/calls/end", lambda d: {"call_id": answered_call()}, 2),
+    "call_history": ("GET", "/calls/history", None, 1),
+    "send_friend_request": ("POST", "/friends/friends_request", lambda d: {"receiver_id": STRANGER}, 5),
+    "accept_friend_request": ("POST", "/friends/accept_request", lambda d: {"sender_id": d["senders"][0]}, 3),
+    "reject_friend_request": ("POST", "/friends/reject_request", lambda d: {"sender_id": d["senders"][0]}, 3),
+    "bulk_accept": ("POST", "/friends/accept_requests", lambda d: {"sender_ids": d["senders"]}, 3),
+    "bulk_reject": ("POST", "/friends/reject_requests", lambda d: {"sender_ids": d["senders"]}, 3),
+    "pending_requests": ("GET", "/friends/pending_requests", None, 3),
+    "friend_suggestions": ("GET", "/friends/suggestions", None, 2),
+    "friends_list": ("GET", "/friends_list/friends_list", None, 2),
+    "get_or_create_chat": ("POST", "/chat/get_or_create_chat",
+                           lambda d: {"user_id_1": ME, "user_id_2": d["friends"][0]}, 1),
+    "send_message": ("POST", "/chat/send_message",
+                     lambda d: {"chat_id": first_chat(d), "sender": ME, "message": "hi", "client_id": "new-1"}, 5),
+    "send_messages_batch": ("POST", "/chat/send_messages", lambda d: {"messages": [
+        {"client_id": f"c{i}", "chat_id": first_chat(d), "message": f"queued {i}"} for i in range(d["n"])
+    ]}, 3),
+    "get_messages": ("GET", "/chat/get_messages", lambda d: {"chat_id": first_chat(d)}, 2),
+    "export_chat": ("GET", "/chat/export", lambda d: {"chat_id": first_chat(d)}, 2),
+    "search_messages": ("GET", "/chat/search", warm_search, 0),
+    "delete_message": ("DELETE", "/chat/delete_message",
+                       lambda d: {"chat_id": first_chat(d), "message_id": "m000001"}, 4),
+    "inbox": ("GET", "/chat/inbox", None, 1),
+    "mark_read": ("POST", "/chat/mark_read", lambda d: {"chat_id": first_chat(d)}, 2),
+    "log_random_chat": ("POST", "/random_chat/log",
+                        lambda d: {"other_user_id": STRANGER, "other_username": "stranger"}, 1),
+    "random_chat_history": ("GET", "/random_chat/history", None, 1),
+    "public_profile": ("GET", f"/random_chat/profile/public/{STRANGER}", None, 1),
+    "match_join": ("POST", "/random_chat/match/join", lambda d: {"mode": "interests"}, 1),
+    "match_status": ("GET", "/random_chat/match/status", None, 0),
+    "get_profile": ("GET", "/profile/get", None, 1),
+    "update_profile": ("PUT", "/profile/update", lambda d: {"whoami": "new bio"}, 2),
+    "find_user": ("GET", "/find_user/find", lambda d: {"search": "name0001"}, 2),
+    "presence_heartbeat": ("POST", "/presence/heartbeat", None, 0),
+    "presence_friends": ("GET", "/presence/friends", None, 2),
+    "admin_analytics": ("GET", "/admin/analytics",
+                        lambda d: {"granularity": "day", "start": "2026-01-01", "end": "2026-01-31"}, 2),
+}
+
+
+# Routes whose Firebase traffic must not grow with the user's friends, chats or
+# messages; the others return (or take) lists that grow with the data
+CONSTANT_BYTES = {
+    "accept_friend_request", "reject_friend_request", "send_friend_request",
+    "get_or_create_chat", "send_message", "delete_message", "mark_read",
+    "log_random_chat", "random_chat_history", "public_profile", "match_join", "match_status",
+    "get_profile", "update_profile", "find_user", "presence_heartbeat",
+    "signup", "verify_email", "login", "reset_password", "google_signup", "google_login",
+    "start_call", "answer_call", "relay_candidate", "reject_call", "end_call", "search_messages",
+}
+
+
+@pytest.fixture(autouse=True)
+def admin_user(monkeypatch):
+    monkeypatch.setattr(routes.admin, "ADMIN_UIDS", {ME})
+
+
+def measure(client, backend, auth_headers, route, n):
+    method, path, body, _ = ROUTES[route]
+    backend.rtdb.tree.clear()
+    backend.firestore.docs.clear()
+    backend.reset_services()
+    data = seed(backend, n)
+    kwargs = {"headers": auth_headers(ME)}
+    if body is not None:
+        if method == "GET":
+            kwargs["query_string"] = body(data)
+        else:
+            kwargs["json"] = body(data)
+
+    backend.recorder.reset()
+    response = client.open(path, method=method, **kwargs)
+    response.get_data()  # drain streamed responses
+    # Call history is written by the hub's single background writer
+    routes.calls.call_hub._history_writer.submit(lambda: None).result(timeout=5)
+    assert response.status_code < 300, (route, response.status_code, response.get_json())
+    return backend.recorder.summary()
+
+
+@pytest.mark.parametrize("route", sorted(ROUTES))
+def test_round_trips_constant_and_within_budget(app, backend, auth_headers, route):
+    client = app.test_client()
+    small = measure(client, backend, auth_headers, route, SMALL)
+    large = measure(client, backend, auth_headers, route, LARGE)
+
+    assert large["round_trips"] == small["round_trips"], (
+        f"{route}: round trips grow with data size "
+        f"({small['round_trips']} at n={SMALL}, {large['round_trips']} at n={LARGE}): {large['ops']}"
+    )
+    budget = ROUTES[route][3]
+    assert large["round_trips"] <= budget, f"{route}: {large['round_trips']} round trips > budget {budget}: {large['ops']}"
+    if route in CONSTANT_BYTES:
+        # 10x the data; a few bytes of slack for longer IDs and counters in the payload
+        assert large["bytes"] <= small["bytes"] * 1.1, (
+            f"{route}: bytes grow with data size ({small['bytes']} at n={SMALL}, {large['bytes']} at n={LARGE}): "
+            f"{large['ops']}"
+        )
+
+
+def test_search_is_served_from_memory_once_warm(app, backend, auth_headers):
+    client = app.test_client()
+    seed(backend, LARGE)
+    headers = auth_headers(ME)
+
+    warmup = client.get("/chat/search", query_string={"q": "hello"}, headers=headers)
+    assert warmup.status_code == 200
+
+    backend.recorder.reset()
+    response = client.get("/chat/search", query_string={"q": "hello numb"}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["total"] == LARGE * LARGE
+    assert backend.recorder.summary()["round_trips"] == 0
+
+
+def test_admin_analytics_merges_sketches_per_bucket(app, backend, auth_headers):
+    seed(backend, SMALL)
+    response = app.test_client().get(
+        "/admin/analytics",
+        query_string={"granularity": "day", "start": "2026-01-01", "end": "2026-01-02"},
+        headers=auth_headers(ME),
+    )
+    buckets = response.get_json()["buckets"]
+    assert [b["bucket"] for b in buckets] == ["2026-01-01", "2026-01-02"]
+    assert [b["messages"] for b in buckets] == [1, 2]
+    assert all(b["active_users"] == 1 for b in buckets)
+
+
+@pytest.mark.parametrize("n", [SMALL, 1234])
+def test_export_reads_one_page_per_chunk(app, backend, auth_headers, n):
+    client = app.test_client()
+    chat_id = chat_id_for(ME, uid(1))
+    backend.rtdb.seed(f"chats/{chat_id}", {
+        "users": [ME, uid(1)],
+        "messages": {f"m{j:06d}": {"sender": ME, "message": "x", "timestamp": j} for j in range(n)},
+    })
+
+    backend.recorder.reset()
+    response = client.get("/chat/export", query_string={"chat_id": chat_id}, headers=auth_headers(ME))
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert len(lines) == n
+    expected_pages = n // routes.one_chat.EXPORT_CHUNK_SIZE + 1
+    assert backend.recorder.summary()["reads"] == 1 + expected_pages
+    assert max(op[3] for op in backend.recorder.summary()["ops"]) < 100 * routes.one_chat.EXPORT_CHUNK_SIZE
+
+
+def test_mark_read_rejects_non_members_and_backfills_legacy_chats(app, backend, auth_headers):
+    client = app.test_client()
+    headers = auth_headers(ME)
+    legacy_chat = chat_id_for(ME, STRANGER)
+    backend.rtdb.seed(f"chats/{legacy_chat}", {"users": [ME, STRANGER], "last_message": None})
+
+    response = client.post("/chat/mark_read", json={"chat_id": "chat_nonexistent"}, headers=headers)
+    assert response.status_code == 403
+    assert backend.rtdb._get(["inbox", ME]) is None
+
+    response = client.post("/chat/mark_read", json={"chat_id": legacy_chat}, headers=headers)
+    assert response.status_code == 200
+    entry = backend.rtdb._get(["inbox", ME, legacy_chat])
+    assert entry["other_user_id"] == STRANGER and entry["unread_count"] == 0
+
+
+def test_batch_replay_is_reported_as_duplicate_across_workers(app, backend, auth_headers):
+    client = app.test_client()
+    data = seed(backend, SMALL)
+    headers = auth_headers(ME)
+    batch = {"messages": [
+        {"client_id": "c1", "chat_id": first_chat(data), "message": "queued"},
+        {"client_id": "c1", "chat_id": first_chat(data), "message": "queued"},
+    ]}
+
+    first = client.post("/chat/send_messages", json=batch, headers=headers).get_json()
+    assert list(first["sent"]) == ["c1"]
+    assert first["duplicates"] == first["sent"]
+
+    # Nothing is remembered in-process; the replay is caught by the stored client_id
+    backend.reset_services()
+    replay = client.post("/chat/send_messages", json=batch, headers=headers).get_json()
+    assert replay["sent"] == {} and replay["duplicates"] == first["sent"]
+    messages = backend.rtdb._get(["chats", first_chat(data), "messages"])
+    assert sum(1 for msg in messages.values() if msg.get("client_id") == "c1") == 1
+
+
+def test_send_message_retry_with_same_client_id_posts_once(app, backend, auth_headers):
+    client = app.test_client()
+    data = seed(backend, SMALL)
+    body = {"chat_id": first_chat(data), "sender": ME, "message": "hi", "client_id": "retry-1"}
+
+    first = client.post("/chat/send_message", json=body, headers=auth_headers(ME)).get_json()
+    retry = client.post("/chat/send_message", json=body, headers=auth_headers(ME)).get_json()
+
+    assert retry["message_id"] == first["message_id"]
+    messages = backend.rtdb._get(["chats", first_chat(data), "messages"])
+    assert sum(1 for msg in messages.values() if msg.get("client_id") == "retry-1") == 1
+
+
+def test_inbox_pages_do_not_skip_conversations_with_equal_timestamps(app, backend, auth_headers):
+    client = app.test_client()
+    headers = auth_headers(ME)
+    for i in range(1, 8):
+        backend.rtdb.seed(f"inbox/{ME}/{chat_id_for(ME, uid(i))}", {"other_user_id": uid(i), "updated_at": 5 if i < 6 else i})
+
+    seen, params = [], {"limit": 2}
+    while True:
+        page = client.get("/chat/inbox", query_string=params, headers=headers).get_json()
+        seen += [c["chat_id"] for c in page["conversations"]]
+        if page["next_before"] is None:
+            break
+        params = {"limit": 2, "before": page["next_before"], "before_id": page["next_before_id"]}
+
+    assert sorted(seen) == sorted(chat_id_for(ME, uid(i)) for i in range(1, 8))
+    assert len(seen) == len(set(seen))
+
+    response = client.get("/chat/inbox", query_string={"limit": -3}, headers=headers)
+    assert response.status_code == 200 and len(response.get_json()["conversations"]) == 1
+
+
+def test_send_message_point_reads_client_ids_and_drops_expired_days(app, backend, auth_headers):
+    client = app.test_client()
+    data = seed(backend, LARGE)
+    backend.rtdb.seed(f"client_ids/{ME}/2020-01-01", {"old": "m000000"})
+    body = {"chat_id": first_chat(data), "sender": ME, "message": "hi", "client_id": "fresh"}
+
+    backend.recorder.reset()
+    response = client.post("/chat/send_message", json=body, headers=auth_headers(ME))
+    assert response.status_code == 200
+    assert max(op[3] for op in backend.recorder.summary()["ops"] if op[1] == "read") < 200
+    assert "2020-01-01" not in backend.rtdb._get(["client_ids", ME])
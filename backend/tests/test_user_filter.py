@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from service.user_filter import UserExistenceFilter, create_user_document
+
+
+def added(uid):
+    return SimpleNamespace(type=SimpleNamespace(name="ADDED"), document=SimpleNamespace(id=uid))
+
+
+def wait_for_seed(worker):
+    worker._seeder.submit(lambda: None).result(timeout=5)
+
+
+def seed_users(backend, uids):
+    for uid in uids:
+        backend.firestore.seed(f"users/{uid}", {"uid": uid, "whoami": "x" * 500})
+
+
+def test_users_created_anywhere_reach_every_filter(backend):
+    existing = [f"user{i}" for i in range(100)]
+    seed_users(backend, existing)
+    workers = [UserExistenceFilter(), UserExistenceFilter()]
+    backend.recorder.reset()
+    for worker in workers:
+        assert worker.might_exist("anyone")  # nothing known yet: never a false "no"
+        worker._pending = []
+        worker._seed()
+    # Only document IDs are transferred, not the profiles
+    assert backend.recorder.summary()["bytes"] < 100 * 2 * 10
+
+    # A signup handled by some other process arrives through the user_ids feed
+    create_user_document("newcomer", {"uid": "newcomer", "created_at": "2026-10-19T12:00:00+00:00"})
+    assert backend.firestore.docs["user_ids/newcomer"] == {"created_at": "2026-10-19T12:00:00+00:00"}
+    for worker in workers:
+        worker._on_snapshot([], [added("newcomer")], None)
+
+    for worker in workers:
+        assert worker.might_exist("newcomer")
+        assert all(worker.might_exist(uid) for uid in existing)
+        assert not worker.might_exist("stranger")
+
+
+def test_filter_resizes_instead_of_saturating(backend):
+    worker = UserExistenceFilter(headroom=1.0)
+    worker._pending = []
+    worker._seed()
+    uids = [f"user{i}" for i in range(3000)]
+    seed_users(backend, uids)
+    worker._on_snapshot([], [added(uid) for uid in uids], None)
+    wait_for_seed(worker)
+
+    assert worker._capacity >= 3000
+    assert all(worker.might_exist(uid) for uid in uids)
+    false_positives = sum(worker.might_exist(f"stranger{i}") for i in range(2000))
+    assert false_positives < 100
@@ -0,0 +1,44 @@
+import random
+import threading
+import time
+
+# Same alphabet and layout as Firebase push IDs, so keys generated here sort
+# chronologically alongside keys created by reference.push() or the web SDK.
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+_lock = threading.Lock()
+_last_push_time = 0
+_last_rand_chars = [0] * 12
+
+
+def generate_push_id(timestamp=None):
+    """
+    Generate a Firebase-style push ID locally, without a round trip to RTDB.
+    This lets several children be written together in one multi-path update.
+    """
+    global _last_push_time
+    now = timestamp if timestamp is not None else int(time.time() * 1000)
+
+    with _lock:
+        duplicate_time = now == _last_push_time
+        _last_push_time = now
+
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        time_chars.reverse()
+
+        if not duplicate_time:
+            for i in range(12):
+                _last_rand_chars[i] = random.randrange(64)
+        else:
+            # Same millisecond: increment the random part so IDs stay ordered
+            i = 11
+            while i >= 0 and _last_rand_chars[i] == 63:
+                _last_rand_chars[i] = 0
+                i -= 1
+            if i >= 0:
+                _last_rand_chars[i] += 1
+
+        return "".join(time_chars) + "".join(PUSH_CHARS[c] for c in _last_rand_chars)
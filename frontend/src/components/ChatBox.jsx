@@ -21,8 +21,8 @@ import {
 } from "@mui/icons-material";
 import axiosInstance from "../utils/axiosInstance";
 // Import Firebase modules
-import { getDatabase, ref, onValue, off, update, remove } from "firebase/database";
-import {database} from "../utils/firebaseConfig";
+import { getDatabase, ref, onValue, off, remove } from "firebase/database";
+import { app, database } from "../utils/firebaseConfig";
 
 
 const ChatBox = ({ user, selectedFriend }) => {
@@ -32,6 +32,7 @@ const ChatBox = ({ user, selectedFriend }) => {
   const [loadingMessages, setLoadingMessages] = useState(true);
   const [error, setError] = useState(null);
   const [chatId, setChatId] = useState(null);
+  const [chatDatabaseUrl, setChatDatabaseUrl] = useState(null);
   const [anchorEl, setAnchorEl] = useState(null);
   const [selectedMessage, setSelectedMessage] = useState(null);
   const [snackbarOpen, setSnackbarOpen] = useState(false);
@@ -41,6 +42,8 @@ const ChatBox = ({ user, selectedFriend }) => {
   const messagesEndRef = useRef(null);
   const chatContainerRef = useRef(null);
   const messagesListenerRef = useRef(null);
+  // Text and client_id of a send that failed, so retrying it cannot post it twice
+  const pendingSendRef = useRef(null);
 
   // Initialize or get existing chat
   useEffect(() => {
@@ -54,6 +57,7 @@ const ChatBox = ({ user, selectedFriend }) => {
         });
         
         console.log("Chat initialized:", response.data);
+        setChatDatabaseUrl(response.data.database_url || null);
         setChatId(response.data.chat_id);
       } catch (err) {
         console.error("Error initializing chat:", err);
@@ -80,8 +84,9 @@ const ChatBox = ({ user, selectedFriend }) => {
     
     setLoadingMessages(true);
     
-    // Reference to the messages in this chat
-    const messagesRef = ref(database, `chats/${chatId}/messages`);
+    // Reference to the messages in this chat, on the database instance that stores it
+    const chatDatabase = chatDatabaseUrl ? getDatabase(app, chatDatabaseUrl) : database;
+    const messagesRef = ref(chatDatabase, `chats/${chatId}/messages`);
     messagesListenerRef.current = messagesRef;
     
     // Set up real-time listener
@@ -118,7 +123,7 @@ const ChatBox = ({ user, selectedFriend }) => {
     return () => {
       off(messagesRef);
     };
-  }, [chatId, user?.id]);
+  }, [chatId, chatDatabaseUrl, user?.id]);
 
   // Scroll to bottom when messages change
   useEffect(() => {
@@ -129,9 +134,10 @@ const ChatBox = ({ user, selectedFriend }) => {
   const markMessagesAsRead = (chatId, userId) => {
     if (!chatId || !userId) return;
     
-    // Set unread counter to 0 for this chat
-    const unreadRef = ref(database, `unread/${userId}/${chatId}`);
-    update(unreadRef, { count: 0 });
+    // Reset the unread counter and inbox entry for this chat on the server
+    axiosInstance.post("/chat/mark_read", { chat_id: chatId }).catch((err) => {
+      console.error("Error marking messages as read:", err);
+    });
   };
 
   const handleSendMessage = async (e) => {
@@ -141,10 +147,15 @@ const ChatBox = ({ user, selectedFriend }) => {
     
     setLoading(true);
     try {
+      const text = newMessage.trim();
+      if (pendingSendRef.current?.text !== text) {
+        pendingSendRef.current = { text, clientId: crypto.randomUUID() };
+      }
       const messageData = {
         chat_id: chatId,
         sender: user.id,
-        message: newMessage.trim(),
+        message: text,
+        client_id: pendingSendRef.current.clientId,
       };
       
       // Send message through API
@@ -152,20 +163,12 @@ const ChatBox = ({ user, selectedFriend }) => {
       console.log("Message sent:", response.data);
       
       // Clear message input
+      pendingSendRef.current = null;
       setNewMessage("");
       
       // No need to update messages list manually since Firebase listener will handle it
-      
-      // Update unread count for recipient
-      const recipientId = selectedFriend.user_id;
-      const unreadRef = ref(database, `unread/${recipientId}/${chatId}`);
-      
-      // Get current count first, then increment
-      onValue(unreadRef, (snapshot) => {
-        const currentCount = snapshot.exists() ? snapshot.val().count || 0 : 0;
-        update(unreadRef, { count: currentCount + 1 });
-      }, { onlyOnce: true });
-      
+      // The recipient's unread count is incremented by the server
+
     } catch (err) {
       console.error("Error sending message:", err);
       showSnackbar("Failed to send message", "error");
@@ -106,8 +106,9 @@ const FriendsList = ({ user, setSelectedFriend }) => {
         userId < friend.user_id ? friend.user_id : userId
       }`;
       
-      // Listen for last message updates
-      const lastMessageRef = ref(database, `chats/${chatId}/last_message`);
+      // Listen for last message updates on the user's inbox entry, which the
+      // server keeps on the default database wherever the chat itself is stored
+      const lastMessageRef = ref(database, `inbox/${userId}/${chatId}/last_message`);
       onValue(lastMessageRef, (snapshot) => {
         if (snapshot.exists()) {
           const lastMessageData = snapshot.val();
@@ -19,4 +19,4 @@ const database = getDatabase(app); // Pass the app instance to getDatabase
 const auth = getAuth(app);
 const provider = new GoogleAuthProvider();
 
-export { database, auth, provider, signInWithPopup };
\ No newline at end of file
+export { app, database, auth, provider, signInWithPopup };
\ No newline at end of file